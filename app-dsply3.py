@@ -16,6 +16,8 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 
+from faq_engine import render_link_tokens
+
 # ============================================
 #   הגדרת מפתח OpenAI מ־Streamlit Secrets
 # ============================================
@@ -204,47 +206,17 @@ faq_store = FAISS.from_documents(docs, embeddings)
 # ============================================
 #   חיפוש FAQ – fuzzy + embeddings
 # ============================================
-# דרוש לייבא: import re
-# ודא ש-re מיובא בראש הקובץ.
-# הגדרת דפוסי Regex מחוץ לפונקציות (במקום הישן של ה-URL_PATTERN)
-
-# פאטרן 1: קישורי URL מלאים (מחייב https?://)
-URL_PATTERN = re.compile(r'>>(.*?):\s*(https?://.+?)<<', re.DOTALL)
-
-# פאטרן 2: קישורי אימייל (פורמט עם קולון)
-EMAIL_PATTERN = re.compile(r'>>(.*?):\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})<<', re.DOTALL) 
-
-# פאטרן 3: קישורי אימייל (פורמט ללא קולון - כפי שהופיע בפלט שלך)
-EMAIL_PATTERN_NOCONOL = re.compile(r'>>(.*?)\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})<<', re.DOTALL)
-
-
-def replace_link_url(match):
-    """מחליף דפוס >>טקסט: URL<< לפורמט Markdown [טקסט](URL)."""
-    description = match.group(1).strip()
-    url = match.group(2).strip()
-    return f"[{description}]({url})"
-
-def replace_link_email(match):
-    """מחליף דפוס >>טקסט: אימייל<< לפורמט Markdown [טקסט](mailto:אימייל)."""
-    description = match.group(1).strip()
-    email_address = match.group(2).strip()
-    # שימוש בקישור mailto: עבור כתובות אימייל
-    return f"[{description}](mailto:{email_address})"
+# קישורים בפורמט >>תווית: יעד<< מומרים ל-Markdown במעבר אחד על הטקסט
+# (render_link_tokens ב-faq_engine.py, במקום שלושת דפוסי ה-Regex הקודמים)
 
 
 def process_answer_content(answer_text: str) -> str:
     """מטפל בקישורים ובמעברי שורה בטקסט התשובה."""
-    
-    # 1. החלפת קישורי URL (הכי ספציפי)
-    formatted_answer = URL_PATTERN.sub(replace_link_url, answer_text)
-    
-    # 2. החלפת קישורי Email עם קולון
-    formatted_answer = EMAIL_PATTERN.sub(replace_link_email, formatted_answer)
-    
-    # 3. החלפת קישורי Email ללא קולון (צריך לפתור את בעיית האימייל הנוכחית)
-    formatted_answer = EMAIL_PATTERN_NOCONOL.sub(replace_link_email, formatted_answer)
 
-    # 4. 💡 התיקון למעברי שורה: החלפת \r\n (CRLF) ו-\n (LF) ל-<br>
+    # 1. החלפת קישורי URL ו-Email (עם או בלי קולון)
+    formatted_answer = render_link_tokens(answer_text)
+
+    # 2. 💡 התיקון למעברי שורה: החלפת \r\n (CRLF) ו-\n (LF) ל-<br>
     final_content = formatted_answer.replace('\r\n', '<br>').replace('\n', '<br>')
     
     return final_content
@@ -5,34 +5,27 @@
 
 import streamlit as st
 import os
-import re
-import unicodedata
-from dataclasses import dataclass
-from typing import List, Optional
-from rapidfuzz import fuzz, process
-
-import openai
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
-import json 
+from typing import Optional
+
+from faq_api import API_ENABLED, start_api_in_background
+from faq_cache import LRUCache, TURN_CACHE_SIZE
+from faq_embeddings import EMBEDDING_BACKEND
+from faq_engine import FAQEngine, SearchResult, faq_sources
+from faq_reload import FAQReloader
+from faq_history import ChatHistory
 
 # ============================================
 #   הגדרת מפתח OpenAI מ־Streamlit Secrets
+#   (נדרש רק כשספק ה-Embeddings הוא openai; FAQ_EMBEDDING_BACKEND=hashing רץ מקומית)
 # ============================================
 try:
     openai_api_key = st.secrets["OPENAI_API_KEY"]
+    os.environ["OPENAI_API_KEY"] = openai_api_key
 except KeyError:
-    st.error("❌ חסר מפתח OPENAI_API_KEY ב־Streamlit Secrets.")
-    st.stop()
-
-os.environ["OPENAI_API_KEY"] = openai_api_key
-
-# ============================================
-#   משתנה גלובלי לקישורים
-# ============================================
-GLOBAL_CONTACT_DETAILS = {}
-
+    if EMBEDDING_BACKEND == "openai":
+        st.error("❌ חסר מפתח OPENAI_API_KEY ב־Streamlit Secrets.")
+        st.stop()
+    openai_api_key = ""
 
 # ============================================
 #   הגדרות עמוד ו־CSS ל־RTL + עיצוב סופי
@@ -192,201 +185,56 @@ st.markdown(
 )
 
 # ============================================
-#   קריאת קובץ faq.txt מתוך הריפו
+#   מנוע החיפוש – משותף לכל הסשנים בתהליך
+#   (פירסור faq.txt, קורפוס פאזי, אינדקס FAISS ומטמונים נבנים פעם אחת בלבד)
+#   שינוי ב-faq.txt נטען ברקע ומחליף את המנוע כשהוא מוכן – בלי הפעלה מחדש של השרת
+#   FAQ_CORPORA="faq.txt,faq1.txt,..." – כמה קבצים במנוע אחד; ?corpus=faq1 בכתובת בוחר קובץ
 # ============================================
-FAQ_PATH = "faq.txt"
+FAQ_SOURCES = faq_sources()
 
-def read_txt_utf8(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+@st.cache_resource
+def get_reloader(backend: str, api_key: str) -> FAQReloader:
+    return FAQReloader(FAQ_SOURCES, FAQEngine.from_backend(backend, api_key, path=FAQ_SOURCES)).start()
 
 try:
-    raw_faq = read_txt_utf8(FAQ_PATH)
-except FileNotFoundError:
-    st.error(f"❌ קובץ FAQ לא נמצא בנתיב: {FAQ_PATH}. ודא שהקובץ נמצא בתיקייה הנכונה.")
+    reloader = get_reloader(EMBEDDING_BACKEND, openai_api_key)
+except FileNotFoundError as e:
+    st.error(f"❌ קובץ FAQ לא נמצא בנתיב: {e.filename}. ודא שהקובץ נמצא בתיקייה הנכונה.")
     st.stop()
 
+# המנוע הנוכחי – נקרא פעם אחת להרצה, כך שכל ההרצה עובדת מול אותו מנוע גם אם הוחלף באמצע
+engine = reloader.engine
 
-# ============================================
-#   עיבוד ה-FAQ וריכוז הקישורים
-# ============================================
-def normalize_he(s: str) -> str:
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFC", s)
-    s = re.sub(r"[\u200e\u200f]", "", s)
-    s = re.sub(r"[^\w\s\u0590-\u05FF]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip().lower()
-    return s
-
-@dataclass
-class FAQItem:
-    question: str
-    variants: List[str]
-    answer: str
-    instruction: Optional[str] = None
-    contact_details: Optional[dict] = None 
-
-def parse_faq_new(text: str) -> List[FAQItem]:
-    items = []
-    
-    global GLOBAL_CONTACT_DETAILS
-    GLOBAL_CONTACT_DETAILS.clear() 
-
-    # 1. חילוץ כל הקישורים הגלובליים מכל הטקסט
-    all_c_matches = re.findall(r">>([^:]+?)\s*:\s*([^<]+?)<<", text)
-    GLOBAL_CONTACT_DETAILS = {k.strip(): v.strip() for k, v in all_c_matches}
-    
-    # 2. הסרת כל הבלוקים של הקישורים הגלובליים מטקסט ה-FAQ
-    text_without_links = re.sub(r">>([^:]+?)\s*:\s*([^<]+?)<<", "", text)
-    
-    # 3. פיצול לבלוקים של שאלות
-    blocks = re.split(r"(?=שאלה\s*:)", text_without_links) 
-
-    for b in blocks:
-        b = b.strip()
-        if not b:
-            continue
-
-        q_match = re.search(r"שאלה\s*:\s*(.+)", b)
-        v_match = re.search(r"(?s)ניסוחים דומים\s*:\s*(.+?)(?:\nתשובה\s*:|\Z)", b)
-        a_match = re.search(r"(?s)תשובה\s*:\s*(.+?)(?:\nהוראה\s*:|\Z)", b)
-        i_match = re.search(r"(?s)הוראה\s*:\s*(.+?)(?:\n>>|\Z)", b)
-        
-        question = q_match.group(1).strip() if q_match else ""
-        
-        answer = ""
-        if a_match:
-            raw_answer_content = a_match.group(1)
-            lines = raw_answer_content.splitlines()
-            cleaned_lines = [line.strip() for line in lines]
-            answer = '\n'.join(cleaned_lines).strip()
-            
-        variants = []
-        if v_match:
-            raw = v_match.group(1)
-            variants = [s.strip(" -\t") for s in raw.split("\n") if s.strip()]
-
-        instruction = i_match.group(1).strip() if i_match else None
-        
-        items.append(FAQItem(question, variants, answer, instruction, contact_details={}))
-
-    return items
-
-faq_items = parse_faq_new(raw_faq)
-
-# === יצירת Embeddings + FAISS ===
-faq_store = None
-
-# 🎯 הגנת Try/Except סביב אתחול OpenAI/FAISS
-try:
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small", api_key=openai_api_key)
-
-    docs = []
-    for i, item in enumerate(faq_items):
-        merged = " | ".join([item.question] + item.variants)
-        docs.append(Document(page_content=merged, metadata={"idx": i}))
-
-    faq_store = FAISS.from_documents(docs, embeddings)
-    st.session_state.embeddings_ready = True 
-except Exception as e:
-    # אם החיבור/אתחול נכשל, נלכוד את השגיאה, נדווח עליה, ונמשיך לרוץ
-    st.error(f"❌ שגיאה חמורה: יצירת מודל החיפוש נכשלה. האפליקציה תפעל במצב חיפוש פאזי בלבד. ייתכן שיש בעיה במפתח ה-OpenAI. שגיאה: {e}")
-    st.session_state.embeddings_ready = False
-    faq_store = None # ודא שהמשתנה נשאר None במקרה של כשל
-
-
-# ============================================
-#   פונקציה לעיבוד תוכן התשובה (משתמשת בגלובלי)
-# ============================================
-def process_answer_content(item: FAQItem) -> str:
-    global GLOBAL_CONTACT_DETAILS 
-    
-    answer_text = item.answer.strip()
-    
-    # 2. החלפת מילות מפתח בקישורי Markdown בתוך ה-ANSWER
-    if GLOBAL_CONTACT_DETAILS:
-        for key, value in GLOBAL_CONTACT_DETAILS.items():
-            markdown_link = f"[{key}]({value})"
-            answer_text = answer_text.replace(f"[{key}]", markdown_link)
-        
-        
-    # 3. טיפול בשדה 'הוראה' והוספתו בסוף
-    if item.instruction: 
-        instruction = item.instruction
-        
-        # 3א. החלפת מילות מפתח בקישורי Markdown בתוך ההוראה
-        for key, value in GLOBAL_CONTACT_DETAILS.items():
-            markdown_link = f"[{key}]({value})"
-            instruction = instruction.replace(f"[{key}]", markdown_link)
-        
-        answer_text += f"\n\n**הערות והוראות:** {instruction}"
-
-    # הוספת \n\n בין פסקאות
-    final_content = answer_text.replace('\n', '\n\n')
-    return final_content
+# 🎯 אם יצירת מודל החיפוש נכשלה – מדווחים וממשיכים במצב פאזי בלבד
+if not engine.embeddings_ready:
+    st.error(f"❌ שגיאה חמורה: יצירת מודל החיפוש נכשלה. האפליקציה תפעל במצב חיפוש פאזי בלבד. ייתכן שיש בעיה במפתח ה-OpenAI. שגיאה: {engine.embeddings_error}")
 
 
 # ============================================
-#   חיפוש FAQ – fuzzy + embeddings
+#   API ב-HTTP (FAQ_API_ENABLED=1): שרת JSON ברקע, באותו תהליך ועל אותו מנוע ואינדקס
 # ============================================
+@st.cache_resource
+def start_api(_reloader: FAQReloader):
+    return start_api_in_background(lambda: _reloader.engine)
 
-def search_faq(query: str) -> str:
-    nq = normalize_he(query)
+if API_ENABLED:
+    try:
+        start_api(reloader)
+    except OSError as e:
+        st.warning(f"⚠️ לא ניתן להפעיל את ה-API: {e}")
 
-    # --- חיפוש פאזי על שאלות וניסוחים ---
-    scored = []
-    for i, item in enumerate(faq_items):
-        all_texts = [item.question] + item.variants
-        for t in all_texts:
-            score = fuzz.token_sort_ratio(nq, normalize_he(t))
-            scored.append((score, i, t))
 
-    scored.sort(reverse=True, key=lambda x: x[0])
-    best_score, best_idx, _ = scored[0]
+def selected_corpus(engine: FAQEngine) -> Optional[str]:
+    # ?corpus=... בכתובת – תשובות רק מאותו קובץ; בלי (או שם לא מוכר) – מכל הקבצים
+    corpus = st.query_params.get("corpus")
+    return corpus if corpus in engine.corpus_names else None
 
-    if best_score >= 80:
-        item = faq_items[best_idx]
-        final_content = process_answer_content(item)
-        return f"{final_content}\n\nמקור: faq\n\nשאלה מזוהה: {item.question}"
+def search_faq(query: str, corpus: Optional[str] = None) -> SearchResult:
+    return reloader.engine.search(query, corpus)
 
-    # --- fallback: embeddings (עם שיפור ניקוד) ---
-    # 🎯 בדיקה האם המודל מוכן
-    if not st.session_state.embeddings_ready or faq_store is None:
-        return "לא נמצאה תשובה בחיפוש פאזי. החיפוש הסמנטי אינו פעיל עקב שגיאת התחברות ל-OpenAI. נסה לנסח את השאלה מחדש."
-
-    hits = faq_store.similarity_search_with_score(query, k=5)
-    
-    boosted_hits = []
-    for doc, score in hits:
-        idx = doc.metadata["idx"]
-        item = faq_items[idx]
-        fuzzy_score = fuzz.token_sort_ratio(nq, normalize_he(item.question))
-        boosted_score = (score * 0.7) + (1.0 - (fuzzy_score / 100)) * 0.3
-        boosted_hits.append((doc, boosted_score, idx))
-
-    boosted_hits.sort(key=lambda x: x[1])
-    
-    best_doc, best_score, best_idx = boosted_hits[0]
-
-    if best_score <= 1.1: 
-        result_item = faq_items[best_idx]
-        
-        final_content = process_answer_content(result_item)
-
-        similar_questions = [
-            faq_items[d.metadata["idx"]].question
-            for d, s, _ in boosted_hits[1:4] 
-            if s <= 1.3 and faq_items[d.metadata["idx"]].question.strip() != result_item.question.strip()
-        ][:3]
-        
-        if similar_questions:
-            sq_json = json.dumps(similar_questions, ensure_ascii=False)
-            final_content += f"\n\n---SIMILAR_QUESTIONS---{sq_json}"
-
-        return f"{final_content}\n\nמקור: faq\n\nשאלה מזוהה (סמנטי): {result_item.question}"
-
-    return "לא נמצאה תשובה, נסה לנסח את השאלה מחדש."
+# כמה תורות (שאלה + תשובה) מוצגים בכל פעם; הישנים יותר נפתחים בכפתור "הצג שאלות קודמות",
+# כך שעלות כל הרצה חוזרת לא גדלה עם אורך השיחה
+HISTORY_PAGE_SIZE = int(os.environ.get("FAQ_HISTORY_PAGE_SIZE", "10"))
 
 # ============================================
 #   פונקציית Callback לטיפול בשליחת הטופס / לחיצה על שאלה
@@ -398,21 +246,22 @@ def handle_submit(query_text=None):
         query = query_text
 
     if query:
-        st.session_state.messages.append({"role": "user", "content": query})
-        answer = search_faq(query)
-        st.session_state.messages.append({"role": "assistant", "content": answer})
+        # התוצאה נשמרת כאובייקט – ההיסטוריה מוצגת ממנה בלי פירסור
+        corpus = selected_corpus(reloader.engine)
+        result = search_faq(query, corpus)
+        st.session_state.history.append(query, result, corpus)
         st.session_state.query_input = "" 
+        # שאלה חדשה – חוזרים לעמוד הראשון של ההיסטוריה
+        st.session_state.history_shown = HISTORY_PAGE_SIZE
 
 
 # ============================================
 #   ניהול שיחה כמו ChatGPT
 # ============================================
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# ההיסטוריה חסומה בגודל: תורות ישנים נדחסים ל-(שאלה, אינדקס פריט) ומעבר לתקרה נמחקים
+if "history" not in st.session_state:
+    st.session_state.history = ChatHistory()
     
-# 🎯 הוספת בדיקה למצב Embeddings ב-session_state
-if "embeddings_ready" not in st.session_state:
-    st.session_state.embeddings_ready = False
 
 # שאלות נפוצות למסך הראשון
 POPULAR_QUESTIONS = [
@@ -427,7 +276,7 @@ st.markdown("")
 # ----------------------------------------------------
 # 💡 הצגת שאלות נפוצות כרשימה ממוספרת עם כפתור קטן
 # ----------------------------------------------------
-if len(st.session_state.messages) == 0:
+if len(st.session_state.history) == 0:
     st.markdown("### שאלות נפוצות:")
     
     for i, q in enumerate(POPULAR_QUESTIONS, start=1):
@@ -465,58 +314,61 @@ with st.form("ask_form", clear_on_submit=False):
 # ----------------------------------------------------
 # מפריד ויזואלי בין טופס הקלט להיסטוריה
 # ----------------------------------------------------
-if len(st.session_state.messages) > 0:
+if len(st.session_state.history) > 0:
     st.markdown("---") 
 
 # =======================================================================
 # הצגת היסטוריית שיחה ורשימת שאלות קשורות
 # =======================================================================
 
-user_indices = [i for i, msg in enumerate(st.session_state.messages) if msg["role"] == "user"]
+# st.fragment (Streamlit 1.37+): לחיצה בתוך ההיסטוריה מריצה מחדש רק את ההיסטוריה ולא את כל הדף
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda f: f)
 
-for user_idx in user_indices[::-1]:
-    
-    # 1. הצגת הודעת השאלה
-    user_msg = st.session_state.messages[user_idx]
-    st.markdown(f"""
+@st.cache_resource
+def get_turn_cache() -> LRUCache:
+    return LRUCache(TURN_CACHE_SIZE)
+
+turn_cache = get_turn_cache()
+
+def turn_markdown(engine: FAQEngine, query: str, result: SearchResult) -> str:
+    # בועת השאלה + כותרת התשובה + התשובה – נבנה פעם אחת לכל (גרסת FAQ, שאלה, תוצאה)
+    key = (engine.version, query, result)
+    md = turn_cache.get(key)
+    if md is None:
+        md = f"""
 <div class="user-bubble">
-<strong>שאלה:</strong> {user_msg['content']}
+<strong>שאלה:</strong> {query}
 </div>
-""", unsafe_allow_html=True)
-    
-    # 2. הצגת הודעת התשובה (אם קיימת)
-    assistant_idx = user_idx + 1
-    if assistant_idx < len(st.session_state.messages):
-        assistant_msg = st.session_state.messages[assistant_idx]
-        raw_display_content = assistant_msg['content'] 
-        
-        similar_questions = []
-        sq_match = re.search(r"---SIMILAR_QUESTIONS---(.*)", raw_display_content)
-        
-        if sq_match:
-            try:
-                sq_json_str = sq_match.group(1).strip()
-                similar_questions = json.loads(sq_json_str)
-                display_content = raw_display_content.replace(f"\n\n---SIMILAR_QUESTIONS---{sq_json_str}", "").strip()
-            except json.JSONDecodeError:
-                display_content = raw_display_content
-        else:
-            display_content = raw_display_content
-            
-        st.markdown(f"""
+
 <div class="assistant-text">
 <strong>תשובה:</strong>
 </div>
-""", unsafe_allow_html=True)
-        
-        st.markdown(display_content, unsafe_allow_html=True)
+
+{engine.format_result(result)}
+"""
+        turn_cache.put(key, md)
+    return md
+
+def show_older_turns():
+    st.session_state.history_shown = st.session_state.get("history_shown", HISTORY_PAGE_SIZE) + HISTORY_PAGE_SIZE
+
+@fragment
+def render_history():
+    history = st.session_state.history
+    shown = st.session_state.get("history_shown", HISTORY_PAGE_SIZE)
+    # ב-fragment רק הפונקציה רצה מחדש – לוקחים את המנוע הנוכחי ולא את זה של ההרצה המלאה האחרונה
+    engine = reloader.engine
+
+    for turn_id, query, result in history.recent(engine, shown):
+        st.markdown(turn_markdown(engine, query, result), unsafe_allow_html=True)
 
         # 💡 הצגת השאלות הקשורות כרשימה ממוספרת עם כפתור קטן
+        similar_questions = engine.similar_questions(result)
         if similar_questions:
             st.markdown("---") 
             st.markdown("#### שאלות קשורות:")
             
-            base_key = f"similar_q_{user_idx}" 
+            base_key = f"similar_q_{turn_id}" 
             
             for i, sq in enumerate(similar_questions, start=1):
                 # 💡 חלוקה ל-2 עמודות: שאלה (80%), כפתור (20%) עם gap="small"
@@ -534,3 +386,20 @@ for user_idx in user_indices[::-1]:
                         on_click=handle_submit, 
                         args=(sq,)
                     )
+
+    hidden = len(history) - shown
+    if hidden > 0:
+        st.button(f"הצג שאלות קודמות ({hidden})", key="show_older", on_click=show_older_turns)
+
+render_history()
+
+# ----------------------------------------------------
+# מונים של המנוע והמטמונים (מוצגים עם ?debug=1 בכתובת)
+# ----------------------------------------------------
+if st.query_params.get("debug"):
+    st.sidebar.markdown("#### מנוע החיפוש")
+    st.sidebar.json(engine.stats())
+    st.sidebar.markdown("#### טעינה מחדש של ה-FAQ")
+    st.sidebar.json(reloader.stats())
+    st.sidebar.markdown("#### היסטוריית הסשן")
+    st.sidebar.json(st.session_state.history.memory_report())
@@ -4,7 +4,7 @@ import unicodedata
 from dataclasses import dataclass
 from typing import List, Optional
 from rapidfuzz import fuzz
-import requests
+from faq_http import http_get
 
 # =========================================================
 #   עיצוב בסיסי – RTL + בועות בסגנון ChatGPT
@@ -101,7 +101,7 @@ FAQ_URL = "https://raw.githubusercontent.com/arie5981/faq1/main/faq.txt"
 
 @st.cache_data
 def load_faq_text(url: str) -> str:
-    resp = requests.get(url)
+    resp = http_get(url)
     resp.encoding = "utf-8"
     return resp.text
 
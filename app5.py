@@ -6,7 +6,6 @@ import copy
 from dataclasses import dataclass
 from typing import List, Optional
 
-import requests
 import streamlit as st
 from rapidfuzz import fuzz
 
@@ -14,6 +13,8 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 
+from faq_http import RemoteFAQ
+
 
 # =========================
 # הגדרות כלליות ו־CSS
@@ -165,15 +166,14 @@ os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 FAQ_URL = "https://raw.githubusercontent.com/arie5981/faq1/main/faq.txt"
 
 
-@st.cache_data(show_spinner="טוען את קובץ ה־FAQ מ-GitHub...")
-def load_faq_from_github(url: str) -> str:
-    resp = requests.get(url)
-    resp.raise_for_status()
-    resp.encoding = "utf-8"
-    return resp.text
+# עותק מקומי + בדיקה ברקע בבקשות מותנות (ETag / Last-Modified). raw_faq משתנה רק כשב-GitHub
+# יש תוכן חדש, ואז build_faq_index (שנשמר לפי הטקסט) מפרסר ובונה אינדקס מחדש
+@st.cache_resource(show_spinner="טוען את קובץ ה־FAQ מ-GitHub...")
+def load_faq_from_github(url: str) -> RemoteFAQ:
+    return RemoteFAQ(url).start()
 
 
-raw_faq = load_faq_from_github(FAQ_URL)
+raw_faq = load_faq_from_github(FAQ_URL).text
 
 # =========================
 # נורמליזציה לעברית
@@ -256,7 +256,8 @@ def parse_faq_new(text: str) -> List[FAQItem]:
 # =========================
 # יצירת אינדקס Embeddings
 # =========================
-@st.cache_resource(show_spinner="יוצר אינדקס Embeddings...")
+# max_entries: אחרי עדכון ב-GitHub האינדקס של הגרסה הקודמת משתחרר מהזיכרון
+@st.cache_resource(show_spinner="יוצר אינדקס Embeddings...", max_entries=1)
 def build_faq_index(faq_text: str, api_key: str):
     items = parse_faq_new(faq_text)
     embeddings = OpenAIEmbeddings(
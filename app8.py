@@ -9,6 +9,8 @@ from rapidfuzz import fuzz
 import requests
 import unicodedata
 
+from faq_http import http_get
+
 # ודא שמפתח API מוגדר בסביבה
 # הערה: עדיף להשתמש ב-st.secrets, אך נשאר עם os.getenv כרגע
 openai.api_key = os.getenv('OPENAI_API_KEY')
@@ -238,7 +240,7 @@ FAQ_URL = "https://raw.githubusercontent.com/arie5981/faq1/main/faq.txt"
 
 # טיפול בשגיאות טעינה
 try:
-    faq_text = requests.get(FAQ_URL).text
+    faq_text = http_get(FAQ_URL).text
 except requests.exceptions.RequestException as e:
     st.error(f"שגיאה בטעינת קובץ השאלות הנפוצות: {e}")
     faq_text = ""
@@ -0,0 +1,624 @@
+# ============================================
+#   מדידת ביצועים למנוע ה-FAQ
+#   הרצה:  python bench_faq.py fuzzy | semantic | parse | coldstart | links | batch | async | provider | remote | corpora | stream
+# ============================================
+
+import os
+import re
+import json
+import base64
+import hashlib
+import asyncio
+import threading
+import time
+import tempfile
+import tracemalloc
+import random
+import argparse
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+from rapidfuzz import fuzz
+from langchain_core.embeddings import Embeddings
+
+from faq_embeddings import EMBEDDING_BACKEND, EMBEDDING_BACKENDS, HashingEmbeddings, make_embeddings
+from faq_http import CircuitBreaker, RemoteFAQ, fetch_text
+from faq_engine import (
+    FAQ_PATH,
+    INDEX_MODES,
+    FAQItem,
+    read_txt_utf8,
+    normalize_he,
+    parse_faq,
+    parse_faq_new,
+    build_fuzzy_corpus,
+    fuzzy_best_match,
+    build_faq_documents,
+    build_faq_store,
+    iter_faq_file,
+    stream_build_faq_store,
+    pool_hits,
+    FAQEngine,
+    faq_sources,
+    read_corpora,
+    render_link_tokens,
+)
+
+QUERIES = [
+    "איך מוסיפים משתמש חדש באתר מייצגים.",
+    "מקבל הודעה שאחד או יותר מנתוני ההזדהות שגויים.",
+    "איך יוצרים קיצור דרך לאתר מייצגים על שולחן העבודה.",
+    "רוצה לקבל את הקוד החד פעמי לדואר אלקטרוני.",
+    "שכחתי סיסמה",
+    "מה עושים כשהאתר לא עובד",
+]
+
+WORDS = (
+    "איך מה למה מתי אתר מייצגים משתמש סיסמה קוד הודעה דוח מעסיק מבוטח "
+    "תשלום מקדמה אישור טופס פקס אימייל נייד עדכון הוספה מחיקה הרשאה"
+).split()
+
+
+# ============================================
+#   FAQ סינתטי בפורמט של faq.txt
+# ============================================
+def synthetic_faq_text(n_items: int, n_variants: int = 7, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+
+    def sentence(n: int) -> str:
+        return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+    parts = [">>אתר שירות אישי: https://ps.btl.gov.il/<<\n"]
+    for i in range(n_items):
+        parts.append(f"שאלה: {sentence(8)} {i}\n")
+        parts.append("ניסוחים דומים:\n")
+        for _ in range(n_variants):
+            parts.append(f"- {sentence(7)}\n")
+        parts.append(f"תשובה: {sentence(40)} [אתר שירות אישי].\n{sentence(30)}\n\n")
+    return "".join(parts)
+
+
+# ============================================
+#   עזרי מדידה
+# ============================================
+def per_query_ms(fn: Callable[[str], object], queries: List[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            fn(q)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+def report(label: str, before_ms: float, after_ms: float) -> None:
+    print(f"{label:<28} before {before_ms:9.3f} ms/query   after {after_ms:9.3f} ms/query   x{before_ms / after_ms:6.1f}")
+
+
+# ============================================
+#   שלב פאזי: נרמול בכל שאילתה מול קורפוס מנורמל מראש
+# ============================================
+def _legacy_fuzzy(query: str, items) -> tuple:
+    # העתק של הלולאה המקורית מ-app.py – לצורך השוואה בלבד
+    nq = normalize_he(query)
+    scored = []
+    for i, item in enumerate(items):
+        for t in [item.question] + item.variants:
+            scored.append((fuzz.token_sort_ratio(nq, normalize_he(t)), i, t))
+    scored.sort(reverse=True, key=lambda x: x[0])
+    return scored[0][:2]
+
+def bench_fuzzy(args) -> None:
+    cases = [("faq.txt", read_txt_utf8(args.faq), 20), ("synthetic 10k items", synthetic_faq_text(10_000), 1)]
+    for label, text, repeat in cases:
+        items = parse_faq_new(text)
+        corpus = build_fuzzy_corpus(items)
+        before = per_query_ms(lambda q: _legacy_fuzzy(q, items), QUERIES, repeat)
+        after = per_query_ms(lambda q: fuzzy_best_match(normalize_he(q), corpus), QUERIES, repeat)
+        report(label, before, after)
+
+
+# ============================================
+#   שלב סמנטי: merged מול multi (recall@1 על ניסוח שהוצא מהאינדקס)
+# ============================================
+def bench_semantic(args) -> None:
+    items = [it for it in parse_faq_new(read_txt_utf8(args.faq)) if it.question and len(it.variants) >= 2]
+
+    # הניסוח האחרון של כל שאלה משמש כשאילתה ולא נכנס לאינדקס
+    train = [FAQItem(it.question, it.variants[:-1], it.answer) for it in items]
+    queries = [it.variants[-1] for it in items]
+
+    embeddings, _ = make_embeddings(args.backend)
+    query_vectors = embeddings.embed_documents(queries)
+
+    for mode in INDEX_MODES:
+        docs = build_faq_documents(train, mode)
+        store = build_faq_store(docs, embeddings)
+        fetch_k = 5 * max(1 + len(it.variants) for it in train) if mode == "multi" else 5
+
+        correct = 0
+        start = time.perf_counter()
+        for expected, vec in enumerate(query_vectors):
+            top = pool_hits(store.similarity_search_with_score_by_vector(vec, k=fetch_k), 5)
+            correct += bool(top) and top[0][0] == expected
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+
+        print(f"{mode:<8} vectors {len(docs):5d}   recall@1 {correct / len(queries):6.1%}   search {elapsed_ms:7.3f} ms/query")
+
+
+# ============================================
+#   פירסור: הפרסר החד-מעברי מול שרשרת ה-regex הקודמת, על FAQ סינתטי גדל
+# ============================================
+def _legacy_parse(text: str) -> list:
+    # העתק של parse_faq_new המקורי (findall + sub + split + ארבעה search לכל בלוק)
+    links = {k.strip(): v.strip() for k, v in re.findall(r">>([^:]+?)\s*:\s*([^<]+?)<<", text)}
+    text = re.sub(r">>([^:]+?)\s*:\s*([^<]+?)<<", "", text)
+    items = []
+    for b in re.split(r"(?=שאלה\s*:)", text):
+        b = b.strip()
+        if not b:
+            continue
+        q = re.search(r"שאלה\s*:\s*(.+)", b)
+        v = re.search(r"(?s)ניסוחים דומים\s*:\s*(.+?)(?:\nתשובה\s*:|\Z)", b)
+        a = re.search(r"(?s)תשובה\s*:\s*(.+?)(?:\nהוראה\s*:|\Z)", b)
+        i = re.search(r"(?s)הוראה\s*:\s*(.+?)(?:\n>>|\Z)", b)
+        items.append(FAQItem(
+            q.group(1).strip() if q else "",
+            [x.strip(" -\t") for x in v.group(1).split("\n") if x.strip()] if v else [],
+            "\n".join(line.strip() for line in a.group(1).splitlines()).strip() if a else "",
+            i.group(1).strip() if i else None,
+            contact_details={},
+        ))
+    return items, links
+
+def bench_parse(args) -> None:
+    base = synthetic_faq_text(100)
+    for mb in args.sizes:
+        text = base * max(1, round(mb * 1024 * 1024 / len(base.encode("utf-8"))))
+        size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+        timings = []
+        for fn in (_legacy_parse, parse_faq):
+            start = time.perf_counter()
+            fn(text)
+            timings.append(time.perf_counter() - start)
+        print(f"{size_mb:7.1f} MB   legacy {timings[0]:7.2f} s ({size_mb / timings[0]:6.1f} MB/s)"
+              f"   single-pass {timings[1]:7.2f} s ({size_mb / timings[1]:6.1f} MB/s)")
+
+
+# ============================================
+#   stream: פירסור ובניית אינדקס מקובץ בזרימה מול קריאת הקובץ כולו ואז פירסור ובנייה
+# ============================================
+class _SlowBatchEmbeddings(Embeddings):
+    # מדמה round-trip ברשת לכל מנת Embeddings של מסמכים
+    def __init__(self, inner, delay: float):
+        self.inner = inner
+        self.delay = delay
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.delay)
+        return self.inner.embed_documents(texts)
+
+def _traced(fn):
+    # (תוצאה, זמן ב-ms, שיא הקצאות ב-MB) – tracemalloc מאט, אז הזמנים להשוואה בלבד
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def bench_stream(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1. פירסור בלבד: קובץ גדול, שיא הזיכרון של המעבר עצמו (בלי לשמור את הפריטים)
+        path = os.path.join(tmp, "faq.txt")
+        base = synthetic_faq_text(100)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(base * max(1, round(args.stream_mb * 1024 * 1024 / len(base.encode("utf-8")))))
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        def count_streamed() -> int:
+            return sum(1 for _ in iter_faq_file(path))
+
+        def count_whole() -> int:
+            return len(parse_faq(read_txt_utf8(path))[0])
+
+        print(f"parse {size_mb:.1f} MB file (items are not kept):")
+        for label, fn in (("read + parse_faq", count_whole), ("iter_faq_file", count_streamed)):
+            n, elapsed, peak = _traced(fn)
+            print(f"  {label:<28} {n:7} items   {elapsed:9.1f} ms   peak {peak:8.2f} MB")
+
+        # 2. בניית אינדקס: Embeddings עם השהיה לכל מנה – בזרימה המנות יוצאות כבר בזמן הקריאה
+        inner, _ = make_embeddings(args.backend)
+        embeddings = _SlowBatchEmbeddings(inner, args.latency_ms / 1000)
+        path = os.path.join(tmp, "build.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_faq_text(args.stream_items))
+
+        def whole_build():
+            items, _ = parse_faq(read_txt_utf8(path))
+            return build_faq_store(build_faq_documents(items), embeddings, progress=mark_first)
+
+        def streamed_build():
+            return stream_build_faq_store(path, embeddings, progress=mark_first)[0]
+
+        print(f"build index, {args.stream_items} items, {args.latency_ms:.0f} ms per embedding batch:")
+        first, started = [], [0.0]
+
+        def mark_first(done, total):
+            if not first:
+                first.append((time.perf_counter() - started[0]) * 1000)
+
+        for label, fn in (("read + parse + build", whole_build), ("stream_build_faq_store", streamed_build)):
+            # זמנים מהרצה בלי tracemalloc, שיא הזיכרון מהרצה נפרדת
+            first.clear()
+            started[0] = time.perf_counter()
+            store = fn()
+            elapsed = (time.perf_counter() - started[0]) * 1000
+            _, _, peak = _traced(fn)
+            print(f"  {label:<28} first batch {first[0]:8.1f} ms   total {elapsed:8.1f} ms"
+                  f"   peak {peak:7.2f} MB   {store.index.ntotal} vectors")
+
+
+# ============================================
+#   עלייה קרה: זמן עד לתשובה הראשונה, עם ובלי snapshot בינארי
+# ============================================
+def bench_coldstart(args) -> None:
+    embeddings, model_name = make_embeddings(args.backend)
+    cases = [("faq.txt", read_txt_utf8(args.faq)), ("synthetic 10k items", synthetic_faq_text(10_000))]
+    for label, text in cases:
+        with tempfile.TemporaryDirectory() as tmp:
+            index_dir = os.path.join(tmp, "index")
+            snapshot_path = os.path.join(tmp, "snapshot.bin")
+            # הרצה ראשונה בונה את האינדקס וה-snapshot – לא נמדדת
+            FAQEngine(text, embeddings, model=model_name, index_dir=index_dir, snapshot_path=snapshot_path)
+
+            timings = []
+            for snap in (None, snapshot_path):
+                start = time.perf_counter()
+                engine = FAQEngine(text, embeddings, model=model_name, index_dir=index_dir, snapshot_path=snap)
+                engine.search(QUERIES[0])
+                timings.append((time.perf_counter() - start) * 1000)
+        print(f"{label:<28} without snapshot {timings[0]:9.1f} ms   with snapshot {timings[1]:9.1f} ms")
+
+
+# ============================================
+#   batch: search בלולאה מול search_many (אותן שאילתות, מטמון תשובות ריק)
+# ============================================
+class _CountingEmbeddings(Embeddings):
+    # סופר בקשות לספק ה-Embeddings (בכל בקשה של OpenAI יש round-trip ברשת)
+    def __init__(self, inner):
+        self.inner = inner
+        self.requests = 0
+        self.texts = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        self.requests += 1
+        self.texts += 1
+        return self.inner.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        self.texts += len(texts)
+        return self.inner.embed_documents(texts)
+
+def bench_batch(args) -> None:
+    inner, model_name = make_embeddings(args.backend)
+    rnd = random.Random(1)
+    queries = [" ".join(rnd.choice(WORDS) for _ in range(6)) for _ in range(500)]
+    queries += QUERIES * 10
+
+    cases = [("faq.txt", read_txt_utf8(args.faq)), ("synthetic 2k items", synthetic_faq_text(2_000))]
+    for label, text in cases:
+        with tempfile.TemporaryDirectory() as tmp:
+            embeddings = _CountingEmbeddings(inner)
+            engine = FAQEngine(text, embeddings, model=model_name, index_dir=tmp, snapshot_path=None)
+
+            timings, requests = [], []
+            for run in (lambda: [engine.search(q) for q in queries], lambda: engine.search_many(queries)):
+                engine.answer_cache.clear()
+                embeddings.requests = 0
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000 / len(queries))
+                requests.append(embeddings.requests)
+        report(label, *timings)
+        print(f"{'':<28} embedding requests: loop {requests[0]}, search_many {requests[1]}")
+
+
+# ============================================
+#   async: search (פאזי ואז Embedding) מול asearch (Embedding ספקולטיבי במקביל לפאזי)
+# ============================================
+class _DelayedEmbeddings(Embeddings):
+    # מדמה round-trip ברשת לספק ה-Embeddings של השאילתות
+    def __init__(self, inner, delay: float):
+        self.inner = inner
+        self.delay = delay
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.delay)
+        return self.inner.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.delay)
+        return self.inner.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+def bench_async(args) -> None:
+    inner, model_name = make_embeddings(args.backend)
+    embeddings = _DelayedEmbeddings(inner, args.latency_ms / 1000)
+    rnd = random.Random(1)
+    # מילים אקראיות מחוץ לאוצר המילים של ה-FAQ – השלב הפאזי נכשל וכולן נופלות לשלב הסמנטי
+    letters = "אבגדהוזחטיכלמנסעפצקרשת"
+    queries = [" ".join("".join(rnd.choice(letters) for _ in range(5)) for _ in range(6)) for _ in range(20)]
+
+    cases = [("faq.txt", read_txt_utf8(args.faq)), ("synthetic 10k items", synthetic_faq_text(10_000))]
+    for label, text in cases:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = FAQEngine(text, embeddings, model=model_name, index_dir=tmp, snapshot_path=None)
+
+            async def run_async(q: str):
+                return await engine.asearch(q)
+
+            timings = []
+            for run in (engine.search, lambda q: asyncio.run(run_async(q))):
+                engine.answer_cache.clear()
+                timings.append(per_query_ms(run, queries, 1))
+        report(label, *timings)
+
+
+# ============================================
+#   provider: timeout + circuit breaker מול שרת Embeddings מקומי (תואם OpenAI) שמזריק השהיה
+# ============================================
+class _StubEmbeddingsHandler(BaseHTTPRequestHandler):
+    # POST /v1/embeddings – וקטורי hashing; server.latency שניות של השהיה לפני התשובה
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.latency)
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, text in enumerate(inputs):
+            vec = self.server.embedder.embed_query(str(text))
+            if body.get("encoding_format") == "base64":
+                vec = base64.b64encode(array("f", vec).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vec})
+        payload = json.dumps({
+            "object": "list", "data": data, "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except OSError:
+            pass  # הלקוח כבר ויתר (timeout)
+
+    def log_message(self, *args):
+        pass
+
+def bench_provider(args) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubEmbeddingsHandler)
+    server.daemon_threads = True
+    server.latency = 0.0
+    server.embedder = HashingEmbeddings(dim=64)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    embeddings, _ = make_embeddings(
+        "openai", api_key="stub", base_url=base_url, timeout=args.timeout, max_retries=0,
+    )
+    embeddings.check_embedding_ctx_length = False  # טקסט גולמי לשרת, בלי tiktoken
+    cooldown = 2.0
+
+    rnd = random.Random(2)
+    letters = "אבגדהוזחטיכלמנסעפצקרשת"
+
+    def query() -> str:
+        return " ".join("".join(rnd.choice(letters) for _ in range(5)) for _ in range(4))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = FAQEngine(read_txt_utf8(args.faq), embeddings, model="stub", index_dir=tmp, snapshot_path=None)
+        engine.breaker = CircuitBreaker(failures=3, cooldown=cooldown)
+
+        def run(label: str, n: int) -> None:
+            for _ in range(n):
+                start = time.perf_counter()
+                result = engine.search(query())
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"{label:<34} {elapsed:8.1f} ms   stage={result.stage:<12} breaker={engine.breaker.state}")
+
+        run("healthy", 2)
+        server.latency = 5.0
+        run(f"upstream +5s (timeout {args.timeout}s)", 6)
+        server.latency = 0.0
+        time.sleep(cooldown)
+        run("recovered, after cooldown", 2)
+        print(engine.breaker.stats())
+    server.shutdown()
+
+
+# ============================================
+#   remote: RemoteFAQ (בקשות מותנות + עותק מקומי) מול הורדה מלאה, מול שרת HTTP מקומי
+# ============================================
+class _StubFAQHandler(BaseHTTPRequestHandler):
+    # מגיש את server.body עם ETag ו-Last-Modified, ומחזיר 304 לבקשה מותנית שלא השתנתה
+    def do_GET(self):
+        body = self.server.body.encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.server.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.bytes_sent += len(body)
+
+    def log_message(self, *args):
+        pass
+
+def bench_remote(args) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubFAQHandler)
+    server.daemon_threads = True
+    server.body = synthetic_faq_text(20_000)
+    server.last_modified = "Mon, 05 Oct 2026 10:00:00 GMT"
+    server.bytes_sent = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/faq.txt"
+    print(f"FAQ size {len(server.body.encode('utf-8')) / 1e6:.1f} MB")
+
+    def step(label: str, fn) -> None:
+        server.bytes_sent = 0
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{label:<36} {elapsed:8.1f} ms   body bytes {server.bytes_sent:>10,}   -> {result}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        step("full download (fetch_text)", lambda: len(fetch_text(url)))
+        remote = {}
+        step("RemoteFAQ, cold (no local copy)", lambda: remote.setdefault("r", RemoteFAQ(url, tmp, interval=0)).updates)
+        step("refresh, unchanged", lambda: remote["r"].refresh())
+        server.body += "שאלה: שאלה חדשה\nתשובה: תשובה חדשה\n"
+        step("refresh, after server-side change", lambda: remote["r"].refresh())
+        step("RemoteFAQ, warm (copy on disk)", lambda: RemoteFAQ(url, tmp, interval=0).text == server.body)
+        step("  + first revalidation", lambda: RemoteFAQ(url, tmp, interval=0).refresh())
+        print(remote["r"].stats())
+    server.shutdown()
+
+
+# ============================================
+#   קישורים (>>תווית: יעד<<): הטוקנייזר החד-מעברי מול שלושת ה-regex של app-dsply3.py
+# ============================================
+_EMAIL = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+
+def _regex_renderer(desc: str, url_tail: str):
+    url_re = re.compile(r">>" + desc + r":\s*(https?://" + url_tail + r")<<", re.DOTALL)
+    email_re = re.compile(r">>" + desc + r":\s*(" + _EMAIL + r")<<", re.DOTALL)
+    email_nocolon_re = re.compile(r">>" + desc + r"\s*(" + _EMAIL + r")<<", re.DOTALL)
+
+    def render(text: str) -> str:
+        text = url_re.sub(lambda m: f"[{m.group(1).strip()}]({m.group(2).strip()})", text)
+        text = email_re.sub(lambda m: f"[{m.group(1).strip()}](mailto:{m.group(2).strip()})", text)
+        return email_nocolon_re.sub(lambda m: f"[{m.group(1).strip()}](mailto:{m.group(2).strip()})", text)
+    return render
+
+# הגרסה המקורית, וגרסת ייחוס שבה התווית לא חוצה >> או << (זו ההתנהגות הנכונה)
+_legacy_links = _regex_renderer(r"(.*?)", r".+?")
+_reference_links = _regex_renderer(r"((?:(?!<<|>>).)*?)", r"(?:(?!<<).)+?")
+
+def bench_links(args) -> None:
+    # 1. fuzz: טקסט אקראי עם טוקנים תקינים ושבורים – חייב להיות זהה לגרסת הייחוס
+    rnd = random.Random(0)
+    fillers = ["שלום ", "טקסט\n", "abc ", ">>", "<<", ":", " "]
+    labels = ["label", "תווית ב", "מייל", ""]
+    seps = [": ", " ", ":", ":  ", ""]
+    targets = ["https://a.b/c", "http://x/y", "http://", "a@b.com", "x.y@nioi.gov.il", " a@b", "טקסט"]
+    for n in range(args.fuzz):
+        parts = []
+        for _ in range(rnd.randint(1, 8)):
+            parts.append(rnd.choice(fillers))
+            if rnd.random() < 0.7:
+                parts.append(f">>{rnd.choice(labels)}{rnd.choice(seps)}{rnd.choice(targets)}<<")
+        text = "".join(parts)
+        if ">>>" in text or "<<<" in text:
+            continue  # רצפים חופפים – אין פירוש חד-משמעי
+        expected, got = _reference_links(text), render_link_tokens(text)
+        assert expected == got, (text, expected, got)
+    print(f"fuzz: {args.fuzz} random inputs match the reference renderer")
+
+    # 2. קלטים עוינים: תשובות ארוכות עם ">>" שלא נסגר
+    adversarial = {
+        "unclosed '>>label: '": lambda n: ">>תווית: " * n,
+        "unclosed '>>' + email chars": lambda n: ">>" + "a" * n + "@",
+        "many '>>' then one '<<'": lambda n: ">>x " * n + "<<",
+    }
+    for label, make in adversarial.items():
+        for n in (500, 1000, 2000):
+            text = make(n)
+            timings = []
+            for fn in (_legacy_links, render_link_tokens):
+                start = time.perf_counter()
+                fn(text)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{label:<32} n={n:5d}   3 regexes {timings[0]:9.2f} ms   single pass {timings[1]:7.3f} ms")
+
+
+# ============================================
+#   corpora: מנוע נפרד לכל קובץ FAQ מול מנוע אחד לכל הקבצים
+# ============================================
+def bench_corpora(args) -> None:
+    inner, model_name = make_embeddings(args.backend)
+    texts = read_corpora(faq_sources(args.corpora))
+    if isinstance(texts, str):
+        raise SystemExit("--corpora: at least two files")
+
+    def build(make) -> List[FAQEngine]:
+        with tempfile.TemporaryDirectory() as tmp:
+            embeddings = _CountingEmbeddings(inner)
+            tracemalloc.start()
+            start = time.perf_counter()
+            engines = make(embeddings, tmp)
+            elapsed = (time.perf_counter() - start) * 1000
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            vectors = sum(e.store.index.ntotal for e in engines)
+            rows = sum(len(e.corpus.norm_texts) for e in engines)
+        print(f"  build {elapsed:8.1f} ms   memory {memory / 1e6:6.2f} MB   embedded texts {embeddings.texts:5}"
+              f"   vectors {vectors:5}   fuzzy rows {rows:6}")
+        return engines
+
+    def separate(embeddings, tmp):
+        return [
+            FAQEngine(text, embeddings, model=model_name, index_dir=os.path.join(tmp, name), snapshot_path=None)
+            for name, text in texts.items()
+        ]
+
+    def shared(embeddings, tmp):
+        return [FAQEngine(texts, embeddings, model=model_name, index_dir=tmp, snapshot_path=None)]
+
+    print(f"{len(texts)} engines, one per file:")
+    build(separate)
+    print("one engine, all files:")
+    engine, = build(shared)
+    print(json.dumps(engine.corpora_stats(), ensure_ascii=False))
+
+
+BENCHMARKS = {
+    "fuzzy": bench_fuzzy,
+    "semantic": bench_semantic,
+    "parse": bench_parse,
+    "coldstart": bench_coldstart,
+    "links": bench_links,
+    "batch": bench_batch,
+    "async": bench_async,
+    "provider": bench_provider,
+    "remote": bench_remote,
+    "corpora": bench_corpora,
+    "stream": bench_stream,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="מדידת ביצועים למנוע ה-FAQ")
+    parser.add_argument("bench", choices=sorted(BENCHMARKS))
+    parser.add_argument("--faq", default=FAQ_PATH)
+    parser.add_argument("--corpora", default="faq.txt,faq1.txt,faq2.txt,faq3.txt", help="קבצי FAQ מופרדים בפסיק (corpora)")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--latency-ms", type=float, default=150, help="השהיית רשת מדומה ל-Embedding של שאילתה (async)")
+    parser.add_argument("--timeout", type=float, default=0.5, help="timeout לבקשת Embedding (provider)")
+    parser.add_argument("--fuzz", type=int, default=20000, help="מספר קלטים אקראיים ל-links")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[5, 10, 25, 50], help="גדלים ב-MB ל-parse")
+    parser.add_argument("--stream-mb", type=float, default=40, help="גודל הקובץ ב-MB לפירסור ב-stream")
+    parser.add_argument("--stream-items", type=int, default=2000, help="מספר פריטים לבניית האינדקס ב-stream")
+    args = parser.parse_args()
+    BENCHMARKS[args.bench](args)
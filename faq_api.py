@@ -0,0 +1,189 @@
+# ============================================
+#   API ב-HTTP/JSON למנוע ה-FAQ (tornado – מגיע יחד עם streamlit)
+#   GET  /search?q=...[&corpus=faq2]                        -> תוצאה אחת
+#   POST /search/batch  {"queries": [...], "corpus": "faq2"}  -> רשימת תוצאות, באותו סדר
+#   GET  /health                                             -> מצב המנוע והמטמונים
+#   corpus (לא חובה) – חיפוש רק בקובץ FAQ אחד מתוך כמה שנטענו (FAQ_CORPORA); בלי – בכולם
+#
+#   הרצה עצמאית:  python faq_api.py [faq.txt | faq.txt,faq1.txt,...] --port 8502
+#   מתוך app.py:  FAQ_API_ENABLED=1 – שרת ברקע שחולק את אותו מנוע ואותו אינדקס בזיכרון
+#   המנוע מגיע מפונקציה (get_engine) שנקראת פעם אחת לכל בקשה – כך טעינה מחדש של ה-FAQ
+#   (faq_reload) מוחלפת גם ב-API, וכל בקשה עובדת מתחילתה ועד סופה מול מנוע אחד
+# ============================================
+
+import os
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import tornado.web
+
+from faq_engine import FAQ_CORPORA, FAQ_PATH, FAQEngine, SearchResult, faq_sources
+from faq_reload import FAQReloader
+
+API_ENABLED = os.environ.get("FAQ_API_ENABLED", "0") == "1"
+API_HOST = os.environ.get("FAQ_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("FAQ_API_PORT", "8502"))
+# החיפוש עצמו חוסם (rapidfuzz, FAISS, קריאה ל-API של ה-Embeddings) ורץ במאגר תהליכונים
+API_WORKERS = int(os.environ.get("FAQ_API_WORKERS", "8"))
+API_MAX_BATCH = int(os.environ.get("FAQ_API_MAX_BATCH", "256"))
+# Embedding ספקולטיבי במקביל לשלב הפאזי (asearch). כבוי כברירת מחדל: כל בקשה הייתה יוצאת
+# לספק (בתשלום) גם כשהפאזי עונה לבד, ועל FAQ קטן השלב הפאזי מהיר מכדי שיהיה רווח
+API_SPECULATIVE = os.environ.get("FAQ_API_SPECULATIVE", "0") == "1"
+
+
+def result_to_json(engine: FAQEngine, result: SearchResult) -> dict:
+    return {
+        "found": result.found,
+        "answer": result.answer,
+        "item_idx": result.item_idx,
+        "question": engine.items[result.item_idx].question if result.found else None,
+        "score": result.score,
+        "stage": result.stage,
+        "corpus": result.corpus or None,
+        "similar": engine.similar_questions(result),
+    }
+
+
+# ============================================
+#   Handlers
+# ============================================
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, get_engine: Callable[[], FAQEngine], executor: ThreadPoolExecutor):
+        self.get_engine = get_engine
+        self.executor = executor
+
+    def prepare(self):
+        self.engine = self.get_engine()
+
+    def check_corpus(self, corpus) -> Optional[str]:
+        if corpus is None:
+            return None
+        if not isinstance(corpus, str) or corpus not in self.engine.corpus_names:
+            raise tornado.web.HTTPError(400, reason=f"unknown corpus (available: {', '.join(self.engine.corpus_names)})")
+        return corpus
+
+    def write_json(self, data, status: int = 200) -> None:
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(data, ensure_ascii=False))
+
+    def write_error(self, status_code: int, **kwargs) -> None:
+        # שגיאות מוחזרות כ-JSON ולא כדף HTML של tornado
+        self.write_json({"error": self._reason}, status_code)
+
+    async def run_search(self, query: str, corpus: Optional[str] = None) -> dict:
+        # asearch: השלב הפאזי רץ במאגר התהליכונים; עם FAQ_API_SPECULATIVE=1 ה-Embedding של
+        # השאילתה יוצא במקביל אליו, אחרת רק כשהפאזי לא מצא התאמה
+        result = await self.engine.asearch(
+            query, executor=self.executor, speculative=API_SPECULATIVE, corpus=corpus,
+        )
+        return result_to_json(self.engine, result)
+
+
+class SearchHandler(BaseHandler):
+    async def get(self):
+        query = self.get_argument("q", "").strip()
+        if not query:
+            raise tornado.web.HTTPError(400, reason="missing query parameter 'q'")
+        corpus = self.check_corpus(self.get_argument("corpus", None))
+        self.write_json(await self.run_search(query, corpus))
+
+
+class BatchSearchHandler(BaseHandler):
+    async def post(self):
+        try:
+            body = json.loads(self.request.body or b"{}")
+            queries = body.get("queries")
+        except (ValueError, AttributeError):
+            raise tornado.web.HTTPError(400, reason="body must be a JSON object")
+        corpus = self.check_corpus(body.get("corpus"))
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            raise tornado.web.HTTPError(400, reason="'queries' must be a list of strings")
+        if len(queries) > API_MAX_BATCH:
+            raise tornado.web.HTTPError(413, reason=f"at most {API_MAX_BATCH} queries per batch")
+        queries = [q.strip() for q in queries]
+        # כמו ב-GET /search: שאילתה ריקה היא שגיאה (אחרת היא מתאימה בציון 100 לפריט בלי שאלה)
+        blank = [i for i, q in enumerate(queries) if not q]
+        if blank:
+            raise tornado.web.HTTPError(400, reason=f"blank queries at positions {blank[:10]}")
+
+        # search_many: שלב פאזי כמטריצה אחת ובקשת Embeddings אחת לכל השאילתות שנשארו
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            self.executor, self.engine.search_many, queries, corpus,
+        )
+        self.write_json({"results": [result_to_json(self.engine, r) for r in results]})
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json(self.engine.stats())
+
+
+def make_app(get_engine: Callable[[], FAQEngine], workers: int = API_WORKERS) -> tornado.web.Application:
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="faq-api")
+    args = {"get_engine": get_engine, "executor": executor}
+    return tornado.web.Application([
+        (r"/search", SearchHandler, args),
+        (r"/search/batch", BatchSearchHandler, args),
+        (r"/health", HealthHandler, args),
+    ])
+
+
+# ============================================
+#   הרצה: ברקע (מתוך app.py) או כתהליך עצמאי
+# ============================================
+def start_api_in_background(get_engine: Callable[[], FAQEngine], host: str = API_HOST,
+                            port: int = API_PORT) -> threading.Thread:
+    # לולאת asyncio נפרדת בתהליכון daemon. שגיאת bind (למשל פורט תפוס) מועברת לקורא
+    started = threading.Event()
+    error: List[Optional[BaseException]] = [None]
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            make_app(get_engine).listen(port, address=host)
+        except BaseException as e:
+            error[0] = e
+            started.set()
+            loop.close()
+            return
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name="faq-api", daemon=True)
+    thread.start()
+    started.wait()
+    if error[0] is not None:
+        raise error[0]
+    return thread
+
+
+async def serve(get_engine: Callable[[], FAQEngine], host: str = API_HOST, port: int = API_PORT) -> None:
+    make_app(get_engine).listen(port, address=host)
+    print(f"FAQ API listening on http://{host}:{port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    import argparse
+    from faq_embeddings import EMBEDDING_BACKEND, EMBEDDING_BACKENDS
+
+    parser = argparse.ArgumentParser(description="שרת HTTP/JSON לחיפוש ב-FAQ")
+    parser.add_argument("faq_path", nargs="?", default=FAQ_CORPORA or FAQ_PATH, help="קובץ אחד או כמה, מופרדים בפסיק")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--base-url", default=None, help="שרת Embeddings תואם OpenAI (למשל שרת מקומי לבדיקות)")
+    args = parser.parse_args()
+
+    sources = faq_sources(args.faq_path)
+    faq_engine = FAQEngine.from_backend(args.backend, base_url=args.base_url, path=sources)
+    if not faq_engine.embeddings_ready:
+        print(f"semantic search disabled: {faq_engine.embeddings_error}")
+    reloader = FAQReloader(sources, faq_engine).start()
+    asyncio.run(serve(lambda: reloader.engine, args.host, args.port))
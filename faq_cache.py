@@ -0,0 +1,235 @@
+# ============================================
+#   מטמונים למנוע ה-FAQ
+#   LRU בזיכרון + מטמון Embeddings לשאילתות (עם שמירה אופציונלית ל-SQLite)
+# ============================================
+
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# גודל ברירת מחדל למטמון ה-Embeddings של שאילתות, וקובץ השמירה שלו
+QUERY_CACHE_SIZE = int(os.environ.get("FAQ_QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_PATH = os.environ.get("FAQ_QUERY_CACHE_PATH", ".faq_query_cache.sqlite")
+# כמה שאילתות נשמרות בקובץ ה-SQLite (כ-6KB לשאילתה ב-text-embedding-3-small); הוותיקות נמחקות
+QUERY_CACHE_DISK_SIZE = int(os.environ.get("FAQ_QUERY_CACHE_DISK_SIZE", "8192"))
+# הניקוי רץ פעם בכמה כתיבות, כך שהטבלה חורגת לכל היותר במספר הזה
+_PRUNE_EVERY = 64
+
+# מטמון התשובות המלאות: גודל ותוקף בשניות
+ANSWER_CACHE_SIZE = int(os.environ.get("FAQ_ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.environ.get("FAQ_ANSWER_CACHE_TTL", "3600"))
+
+# Markdown מוכן של תורות בהיסטוריית השיחה (שאלה + תשובה), משותף לכל הסשנים
+TURN_CACHE_SIZE = int(os.environ.get("FAQ_TURN_CACHE_SIZE", "4096"))
+
+_MISSING = object()
+
+
+# ============================================
+#   LRU בטוח לריבוי תהליכונים
+# ============================================
+class LRUCache:
+    # ttl=None – ללא תפוגה; אחרת ערך שעבר ttl שניות נחשב כהחטאה ונמחק
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._data[key]
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+# ============================================
+#   מטמון Embeddings לשאילתות
+# ============================================
+class CachedQueryEmbeddings(Embeddings):
+    # עוטף מודל Embeddings קיים: embed_query עובר דרך LRU (ו-SQLite אם הוגדר),
+    # embed_documents עובר ישירות למודל (מסמכי ה-FAQ נשמרים ממילא באינדקס).
+    # גם הטבלה ב-SQLite חסומה: disk_maxsize השורות האחרונות שנכתבו נשארות (לפי rowid –
+    # INSERT OR REPLACE נותן לשורה rowid חדש), והוותיקות נמחקות
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        model: str,
+        maxsize: int = QUERY_CACHE_SIZE,
+        persist_path: Optional[str] = None,
+        key_fn: Optional[Callable[[str], str]] = None,
+        disk_maxsize: int = QUERY_CACHE_DISK_SIZE,
+    ):
+        self.inner = inner
+        self.model = model
+        self.key_fn = key_fn or (lambda s: s)
+        self.cache = LRUCache(maxsize)
+        self.disk_maxsize = disk_maxsize
+        self.disk_hits = 0
+        self._stores = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        if persist_path:
+            try:
+                self._db = sqlite3.connect(persist_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    " model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL,"
+                    " PRIMARY KEY (model, query))"
+                )
+                self._prune()
+                self._db.commit()
+            except sqlite3.Error:
+                # אין אפשרות לכתוב לדיסק – ממשיכים עם מטמון בזיכרון בלבד
+                self._db = None
+
+    def _load(self, key: str) -> Optional[List[float]]:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                (self.model, key),
+            ).fetchone()
+        if row is None:
+            return None
+        vec = array("f")
+        vec.frombytes(row[0])
+        return vec.tolist()
+
+    def _prune(self) -> None:
+        # משאיר את disk_maxsize השורות החדשות ביותר (כל המודלים יחד). נקרא כשה-lock מוחזק
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE rowid <= ("
+            " SELECT rowid FROM query_embeddings ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+            (max(self.disk_maxsize, 0),),
+        )
+
+    def _store(self, key: str, vector: List[float]) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+                    (self.model, key, array("f", vector).tobytes()),
+                )
+                self._stores += 1
+                if self._stores % _PRUNE_EVERY == 0:
+                    self._prune()
+                self._db.commit()
+        except sqlite3.Error:
+            pass
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.key_fn(text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+
+        vector = self._load(key)
+        if vector is not None:
+            self.disk_hits += 1
+        else:
+            vector = self.inner.embed_query(text)
+            self._store(key, vector)
+
+        self.cache.put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # כמו embed_query, עם aembed_query של הספק (אצל OpenAI – בקשת HTTP אסינכרונית שאפשר לבטל)
+        key = self.key_fn(text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+
+        vector = self._load(key)
+        if vector is not None:
+            self.disk_hits += 1
+        else:
+            vector = await self.inner.aembed_query(text)
+            self._store(key, vector)
+
+        self.cache.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # כמו embed_query לכמה שאילתות: מה שלא נמצא בזיכרון או בדיסק נשלח לספק בבקשה אחת
+        # (embed_documents – אצל OpenAI embed_query הוא אותה קריאה לטקסט יחיד)
+        keys = [self.key_fn(t) for t in texts]
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        missing = {}  # מפתח -> טקסט ראשון שמייצג אותו
+        for pos, key in enumerate(keys):
+            if key in missing:
+                continue
+            vector = self.cache.get(key)
+            if vector is None:
+                vector = self._load(key)
+                if vector is not None:
+                    self.disk_hits += 1
+                    self.cache.put(key, vector)
+            if vector is None:
+                missing[key] = texts[pos]
+            vectors[pos] = vector
+
+        if missing:
+            fresh = dict(zip(missing, self.inner.embed_documents(list(missing.values()))))
+            for key, vector in fresh.items():
+                self._store(key, vector)
+                self.cache.put(key, vector)
+            vectors = [v if v is not None else fresh[k] for k, v in zip(keys, vectors)]
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats["disk_hits"] = self.disk_hits
+        # קריאות אמיתיות לספק ה-Embeddings = החטאות שלא נמצאו גם בדיסק
+        stats["provider_calls"] = self.cache.misses - self.disk_hits
+        return stats
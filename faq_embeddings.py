@@ -0,0 +1,86 @@
+# ============================================
+#   ספקי Embeddings למנוע ה-FAQ
+#   openai  – text-embedding-3-small דרך ה-API (ברירת מחדל)
+#   hashing – וקטור n-gram של תווים, מקומי ל-CPU, בלי רשת ובלי קבצי מודל
+# ============================================
+
+import os
+import math
+import zlib
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from faq_engine import EMBEDDING_MODEL, normalize_he
+from faq_http import EMBED_REQUEST_TIMEOUT, EMBED_CLIENT_RETRIES, get_httpx_client
+
+EMBEDDING_BACKEND = os.environ.get("FAQ_EMBEDDING_BACKEND", "openai")
+EMBEDDING_BACKENDS = ("openai", "hashing")
+
+HASHING_DIM = 1024
+HASHING_NGRAMS = (2, 3, 4)
+
+
+# ============================================
+#   Embeddings מקומיים: hashing של n-grams של תווים
+# ============================================
+class HashingEmbeddings(Embeddings):
+    # כל n-gram של תווים (על הטקסט המנורמל) ממופה בעזרת crc32 לאחד מ-dim תאים, עם סימן
+    # מה-hash כדי לצמצם התנגשויות. המשקל הוא 1+log(tf) והווקטור מנורמל לאורך 1,
+    # כך שמרחק L2 באינדקס מתנהג כמו אצל מודלי OpenAI (0 = זהה, 2 = אורתוגונלי)
+
+    def __init__(self, dim: int = HASHING_DIM, ngrams: Tuple[int, ...] = HASHING_NGRAMS):
+        self.dim = dim
+        self.ngrams = ngrams
+
+    @property
+    def model_name(self) -> str:
+        return f"hashing-char{'-'.join(map(str, self.ngrams))}-d{self.dim}"
+
+    def _embed(self, text: str) -> List[float]:
+        s = f" {normalize_he(text)} "
+        counts = {}
+        for n in self.ngrams:
+            for i in range(len(s) - n + 1):
+                h = zlib.crc32(s[i:i + n].encode("utf-8"))
+                slot = h % self.dim
+                sign = 1.0 if (h >> 31) & 1 else -1.0
+                counts[slot] = counts.get(slot, 0.0) + sign
+
+        vec = [0.0] * self.dim
+        for slot, c in counts.items():
+            if c:
+                vec[slot] = math.copysign(1.0 + math.log(abs(c)), c)
+
+        norm = math.sqrt(sum(v * v for v in vec))
+        if norm:
+            vec = [v / norm for v in vec]
+        return vec
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+
+# ============================================
+#   בחירת ספק לפי הגדרה
+# ============================================
+def make_embeddings(backend: str = EMBEDDING_BACKEND, api_key: Optional[str] = None,
+                    base_url: Optional[str] = None, timeout: float = EMBED_REQUEST_TIMEOUT,
+                    max_retries: int = EMBED_CLIENT_RETRIES) -> Tuple[Embeddings, str]:
+    # מחזיר (מודל Embeddings, שם המודל) – השם נכנס למפתח של האינדקס והמטמונים.
+    # base_url מאפשר להפנות את openai לשרת תואם (למשל שרת מקומי לבדיקות).
+    # ל-openai: timeout לכל בקשה ולקוח HTTP משותף עם חיבורי keep-alive (faq_http)
+    if backend == "hashing":
+        emb = HashingEmbeddings()
+        return emb, emb.model_name
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        emb = OpenAIEmbeddings(
+            model=EMBEDDING_MODEL, api_key=api_key, base_url=base_url,
+            request_timeout=timeout, max_retries=max_retries, http_client=get_httpx_client(),
+        )
+        return emb, EMBEDDING_MODEL
+    raise ValueError(f"unknown embedding backend: {backend!r} (expected one of {EMBEDDING_BACKENDS})")
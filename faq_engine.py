@@ -0,0 +1,1286 @@
+# ============================================
+#   מנוע ה-FAQ – פירסור, נרמול ואינדקס FAISS
+#   (ללא תלות ב-Streamlit, כדי שאפשר יהיה לבנות אינדקס מראש)
+# ============================================
+
+import os
+import re
+import asyncio
+import json
+import time
+import struct
+import random
+import hashlib
+import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+from rapidfuzz import fuzz, process
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from faq_http import CircuitBreaker, is_transient_error
+from faq_cache import (
+    LRUCache, CachedQueryEmbeddings, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, QUERY_CACHE_SIZE, QUERY_CACHE_PATH,
+)
+
+FAQ_PATH = "faq.txt"
+# כמה קבצי FAQ במנוע אחד, מופרדים בפסיק (למשל "faq.txt,faq1.txt,faq2.txt,faq3.txt").
+# שם כל קורפוס הוא שם הקובץ בלי הסיומת; ריק – קובץ אחד, FAQ_PATH
+FAQ_CORPORA = os.environ.get("FAQ_CORPORA", "")
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# סף ציון לחיפוש הפאזי – מעליו לא פונים ל-Embeddings
+FUZZY_THRESHOLD = 80
+
+# תיקיית האינדקס השמור (index.faiss + meta.json)
+INDEX_DIR = ".faq_index"
+INDEX_FILE = "index.faiss"
+META_FILE = "meta.json"
+
+# מצב האינדקס: merged – וקטור אחד לכל שאלה (כל הניסוחים מחוברים),
+# multi – וקטור לכל שאלה/ניסוח בנפרד, עם max-pooling לכל FAQItem בזמן החיפוש
+INDEX_MODE = os.environ.get("FAQ_INDEX_MODE", "merged")
+INDEX_MODES = ("merged", "multi")
+
+# בניית האינדקס: גודל מנה לקריאת Embeddings, מספר קריאות מקבילות וניסיונות חוזרים
+EMBED_BATCH_SIZE = int(os.environ.get("FAQ_EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_WORKERS = int(os.environ.get("FAQ_EMBED_MAX_WORKERS", "4"))
+EMBED_MAX_RETRIES = int(os.environ.get("FAQ_EMBED_MAX_RETRIES", "4"))
+EMBED_BACKOFF = 0.5  # שניות; מוכפל בכל ניסיון חוזר
+
+# ============================================
+#   משתנה גלובלי לקישורים
+# ============================================
+GLOBAL_CONTACT_DETAILS = {}
+
+
+# ============================================
+#   קריאה ונרמול
+# ============================================
+def read_txt_utf8(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def normalize_he(s: str) -> str:
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFC", s)
+    s = re.sub(r"[\u200e\u200f]", "", s)
+    s = re.sub(r"[^\w\s\u0590-\u05FF]", " ", s)
+    s = re.sub(r"\s+", " ", s).strip().lower()
+    return s
+
+
+# ============================================
+#   עיבוד ה-FAQ וריכוז הקישורים
+# ============================================
+@dataclass
+class FAQItem:
+    question: str
+    variants: List[str]
+    answer: str
+    instruction: Optional[str] = None
+    contact_details: Optional[dict] = None
+    rendered: Optional[str] = None    # תשובה מוכנה להצגה (Markdown) – ראה render_faq_answers
+
+# תבניות מקומפלות פעם אחת: קישור >>תווית: יעד<< ושורת שדה ("שאלה:", "ניסוחים דומים:" ...)
+_LINK_RE = re.compile(r">>([^:<\n]+?)\s*:\s*([^<\n]+?)<<")
+_STRAY_LINK_RE = re.compile(r">>[^<\n]*<<")   # >>...<< בלי נקודתיים – לא קישור, לא מוצג
+_FIELD_RE = re.compile(r"(שאלה|ניסוחים דומים|תשובה|הוראה)\s*:\s*(.*)")
+
+class FAQParser:
+    # פרסר שורה-שורה (מכונת מצבים): feed() מקבל שורה ומחזיר FAQItem כשבלוק קודם
+    # הסתיים (כלומר כשמתחילה "שאלה:" חדשה), close() מחזיר את הבלוק האחרון.
+    # הקישורים (>>תווית: יעד<<) נאספים ל-links ומוסרים מהטקסט באותו מעבר
+
+    def __init__(self, links: Optional[Dict[str, str]] = None):
+        self.links = {} if links is None else links
+        self._reset()
+        self._seen_content = False
+
+    def _reset(self) -> None:
+        self._state = None            # None | "variants" | "answer" | "instruction" | "done"
+        self._question = ""
+        self._variants = []
+        self._answer = None           # None – עדיין לא הופיעה "תשובה:"
+        self._instruction = None      # None – עדיין לא הופיעה "הוראה:"
+        self._had_variants = False
+
+    def _build(self) -> FAQItem:
+        answer = ""
+        if self._answer is not None:
+            answer = "\n".join(line.strip() for line in self._answer).strip()
+        instruction = None
+        if self._instruction is not None:
+            instruction = "\n".join(self._instruction).strip() or None
+        return FAQItem(self._question, self._variants, answer, instruction, contact_details={})
+
+    def feed(self, line: str) -> Optional[FAQItem]:
+        line = line.rstrip("\r\n")
+        if ">>" in line:
+            for m in _LINK_RE.finditer(line):
+                self.links[m.group(1).strip()] = m.group(2).strip()
+            line = _STRAY_LINK_RE.sub("", _LINK_RE.sub("", line))
+
+        m = _FIELD_RE.match(line.lstrip())
+        field_name, rest = (m.group(1), m.group(2)) if m else (None, None)
+
+        if field_name == "שאלה":
+            finished = self._build() if self._seen_content else None
+            self._reset()
+            self._seen_content = True
+            self._question = rest.strip()
+            return finished
+
+        if line.strip():
+            self._seen_content = True
+
+        if field_name == "ניסוחים דומים" and not self._had_variants and self._answer is None:
+            self._had_variants = True
+            self._state = "variants"
+            line = rest
+        elif field_name == "תשובה" and self._answer is None:
+            self._answer = []
+            self._state = "answer"
+            line = rest
+        elif field_name == "הוראה" and self._instruction is None:
+            self._instruction = []
+            self._state = "instruction"
+            line = rest
+        elif self._state == "instruction" and line.startswith(">>"):
+            # ההוראה נגמרת בשורה שמתחילה ב-">>" (שאינה קישור תקין)
+            self._state = "done"
+            return None
+
+        if self._state == "variants":
+            if line.strip():
+                self._variants.append(line.strip(" -\t"))
+        elif self._state == "answer":
+            self._answer.append(line)
+        elif self._state == "instruction":
+            self._instruction.append(line)
+        return None
+
+    def close(self) -> Optional[FAQItem]:
+        return self._build() if self._seen_content else None
+
+def iter_faq_lines(lines: Iterable[str], links: Optional[Dict[str, str]] = None) -> Iterator[FAQItem]:
+    # גנרטור: מחזיר כל FAQItem ברגע שהבלוק שלו נסגר, בלי להחזיק את כל הקובץ בזיכרון.
+    # הקישורים נאספים ל-links (אם הועבר מילון) תוך כדי הקריאה
+    parser = FAQParser(links)
+    for line in lines:
+        item = parser.feed(line)
+        if item is not None:
+            yield item
+    item = parser.close()
+    if item is not None:
+        yield item
+
+def iter_faq_file(path: str, links: Optional[Dict[str, str]] = None) -> Iterator[FAQItem]:
+    # קריאה שורה-שורה מהקובץ – הזיכרון תלוי בגודל בלוק אחד ולא בגודל הקובץ
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_faq_lines(f, links)
+
+def parse_faq(text: str) -> Tuple[List[FAQItem], Dict[str, str]]:
+    # מעבר יחיד על הטקסט: מחזיר את רשימת ה-FAQItem (עם תשובה מוכנה להצגה)
+    # ואת טבלת הקישורים
+    links = {}
+    items = list(iter_faq_lines(text.splitlines(), links))
+    render_faq_answers(items, links)
+    return items, links
+
+
+# ============================================
+#   הכנת התשובות להצגה – פעם אחת בטעינה ולא בכל תשובה
+# ============================================
+def compile_link_pattern(links: Dict[str, str]) -> Optional[re.Pattern]:
+    # regex אחד לכל המפתחות: [מפתח1]|[מפתח2]|... (ארוכים קודם, כדי שמפתח
+    # שהוא תחילית של מפתח אחר לא ינצח)
+    if not links:
+        return None
+    keys = sorted(links, key=len, reverse=True)
+    return re.compile(r"\[(" + "|".join(re.escape(k) for k in keys) + r")\]")
+
+def render_answer(item: FAQItem, links: Dict[str, str], pattern=None) -> str:
+    pattern = pattern if pattern is not None else compile_link_pattern(links)
+
+    def link(text: str) -> str:
+        # החלפת מילות מפתח בקישורי Markdown במעבר אחד
+        if pattern is None:
+            return text
+        return pattern.sub(lambda m: f"[{m.group(1)}]({links[m.group(1)]})", text)
+
+    answer_text = link(item.answer.strip())
+
+    # טיפול בשדה 'הוראה' והוספתו בסוף
+    if item.instruction:
+        answer_text += f"\n\n**הערות והוראות:** {link(item.instruction)}"
+
+    # הוספת \n\n בין פסקאות
+    return answer_text.replace('\n', '\n\n')
+
+# ============================================
+#   קישורים בתוך הטקסט (>>תווית: יעד<<) – טוקנייזר במעבר יחיד
+# ============================================
+_EMAIL_LOCAL_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._%+-")
+_EMAIL_DOMAIN_RE = re.compile(r"[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+def _link_token_to_markdown(body: str) -> Optional[str]:
+    # גוף הטוקן (בין >> ל-<<) ל-Markdown, או None אם זה לא קישור.
+    # 1. "תווית: http(s)://..."  2. "תווית: אימייל"  3. "תווית אימייל" (בלי נקודתיים)
+
+    # URL: הנקודתיים הראשונות שאחריהן (ורווחים) מגיע http:// או https://
+    pos = body.find(":")
+    while pos != -1:
+        j = pos + 1
+        while j < len(body) and body[j].isspace():
+            j += 1
+        scheme = "https://" if body.startswith("https://", j) else "http://" if body.startswith("http://", j) else None
+        if scheme is not None and len(body) > j + len(scheme):
+            return f"[{body[:pos].strip()}]({body[j:].strip()})"
+        pos = body.find(":", pos + 1)
+
+    # אימייל בסוף הטוקן: הדומיין אחרי ה-@ האחרון, ולפניו רצף תווים חוקיים
+    at = body.rfind("@")
+    if at <= 0 or not _EMAIL_DOMAIN_RE.fullmatch(body, at + 1):
+        return None
+    start = at
+    while start > 0 and body[start - 1] in _EMAIL_LOCAL_CHARS:
+        start -= 1
+    if start == at:
+        return None
+
+    description = body[:start].rstrip()
+    if description.endswith(":"):
+        description = description[:-1]
+    return f"[{description.strip()}](mailto:{body[start:]})"
+
+def render_link_tokens(text: str) -> str:
+    # סריקה לינארית אחת: כל >>...<< שמזוהה כקישור הופך ל-Markdown, כל השאר נשאר כמו שהוא.
+    # ">>" בלי "<<" (או ">>" נוסף לפני ה-"<<") לא פותח חיפוש לאחור – אין backtracking
+    out = []
+    pos = 0
+    n = len(text)
+    while pos < n:
+        start = text.find(">>", pos)
+        if start == -1:
+            break
+        end = text.find("<<", start + 2)
+        if end == -1:
+            break
+        inner = text.rfind(">>", start + 2, end)
+        if inner != -1:
+            # הטוקן האמיתי מתחיל ב-">>" האחרון לפני ה-"<<"
+            out.append(text[pos:inner])
+            start = inner
+        else:
+            out.append(text[pos:start])
+        rendered = _link_token_to_markdown(text[start + 2:end])
+        out.append(rendered if rendered is not None else text[start:end + 2])
+        pos = end + 2
+    out.append(text[pos:])
+    return "".join(out)
+
+def render_faq_answers(items: Iterable[FAQItem], links: Dict[str, str]) -> None:
+    pattern = compile_link_pattern(links)
+    for item in items:
+        item.rendered = render_answer(item, links, pattern)
+
+def parse_faq_new(text: str) -> List[FAQItem]:
+    # ממשק קודם: מחזיר רק את הפריטים ומעדכן את GLOBAL_CONTACT_DETAILS במקום
+    items, links = parse_faq(text)
+    GLOBAL_CONTACT_DETAILS.clear()
+    GLOBAL_CONTACT_DETAILS.update(links)
+    return items
+
+
+# ============================================
+#   כמה קבצי FAQ (קורפוסים) במנוע אחד
+#   הקבצים חולקים את אותן שאלות ונבדלים בקישורים ובניסוח התשובות, ולכן פריט החיפוש
+#   הוא (שאלה, ניסוחים): הקורפוס הפאזי והאינדקס נבנים פעם אחת לכל שאלה, ולכל פריט
+#   נשמרת התשובה של כל קובץ שבו הוא מופיע
+# ============================================
+DEFAULT_CORPUS = "faq"   # שם הקורפוס כשהמנוע נבנה מטקסט יחיד
+
+def corpus_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+def faq_sources(spec: Optional[str] = None) -> Union[str, Dict[str, str]]:
+    # נתיב אחד -> str (מנוע של קובץ יחיד, כמו קודם); כמה נתיבים מופרדים בפסיק -> {שם: נתיב}
+    paths = [p.strip() for p in (spec or FAQ_CORPORA or FAQ_PATH).split(",") if p.strip()]
+    if len(paths) == 1:
+        return paths[0]
+    sources = {}
+    for path in paths:
+        name = corpus_name(path)
+        if name in sources:
+            raise ValueError(f"duplicate FAQ corpus name {name!r} ({sources[name]}, {path})")
+        sources[name] = path
+    return sources
+
+def read_corpora(sources: Union[str, Dict[str, str]]) -> Union[str, Dict[str, str]]:
+    if isinstance(sources, str):
+        return read_txt_utf8(sources)
+    return {name: read_txt_utf8(path) for name, path in sources.items()}
+
+def join_corpora(texts: Union[str, Dict[str, str]]) -> str:
+    # הטקסט שממנו נגזרים גרסת המנוע ומפתחות האינדקס וה-snapshot.
+    # טקסט יחיד – הוא עצמו, כך שהמפתחות של מנוע עם קובץ אחד לא משתנים
+    if isinstance(texts, str):
+        return texts
+    return "".join(f"\0{name}\0{len(text)}\0{text}" for name, text in texts.items())
+
+def parse_corpora(texts: Dict[str, str]) -> Tuple[List[Dict[str, FAQItem]], Dict[str, Dict[str, str]]]:
+    # מחזיר לכל פריט חיפוש {קורפוס: FAQItem} (לפי סדר הקורפוסים) ואת הקישורים של כל קורפוס.
+    # פריט שזהה לגמרי (כולל התשובה המוכנה) בכמה קבצים הוא אותו אובייקט; שאלה שחוזרת
+    # באותו קובץ – הראשונה נשארת, כמו בהתאמה הפאזית
+    answers: List[Dict[str, FAQItem]] = []
+    by_key: Dict[tuple, int] = {}
+    shared: Dict[tuple, FAQItem] = {}
+    links_by_corpus = {}
+    for name, text in texts.items():
+        items, links_by_corpus[name] = parse_faq(text)
+        for item in items:
+            item = shared.setdefault((item.question, tuple(item.variants), item.rendered), item)
+            key = (item.question, tuple(item.variants))
+            idx = by_key.setdefault(key, len(answers))
+            if idx == len(answers):
+                answers.append({})
+            answers[idx].setdefault(name, item)
+    return answers, links_by_corpus
+
+
+# ============================================
+#   קורפוס מנורמל לשלב הפאזי (מחושב פעם אחת בטעינה)
+# ============================================
+@dataclass
+class FuzzyCorpus:
+    texts: List[str] = field(default_factory=list)        # שאלה/ניסוח מקורי
+    norm_texts: List[str] = field(default_factory=list)   # אותו טקסט אחרי normalize_he
+    item_idx: List[int] = field(default_factory=list)     # אינדקס ה-FAQItem של כל שורה
+    norm_questions: List[str] = field(default_factory=list)  # שאלה מנורמלת לכל FAQItem
+    max_texts_per_item: int = 0                              # מספר הניסוחים המרבי לפריט אחד
+
+def build_fuzzy_corpus(items: List[FAQItem]) -> FuzzyCorpus:
+    corpus = FuzzyCorpus()
+    for i, item in enumerate(items):
+        for t in [item.question] + item.variants:
+            corpus.texts.append(t)
+            corpus.norm_texts.append(normalize_he(t))
+            corpus.item_idx.append(i)
+        corpus.norm_questions.append(normalize_he(item.question))
+        corpus.max_texts_per_item = max(corpus.max_texts_per_item, 1 + len(item.variants))
+    return corpus
+
+def filter_fuzzy_corpus(corpus: FuzzyCorpus, keep: set) -> FuzzyCorpus:
+    # הקורפוס רק עם השורות של הפריטים ב-keep; המחרוזות עצמן משותפות, רק הרשימות חדשות
+    sub = FuzzyCorpus(norm_questions=corpus.norm_questions, max_texts_per_item=corpus.max_texts_per_item)
+    for text, norm_text, i in zip(corpus.texts, corpus.norm_texts, corpus.item_idx):
+        if i in keep:
+            sub.texts.append(text)
+            sub.norm_texts.append(norm_text)
+            sub.item_idx.append(i)
+    return sub
+
+def fuzzy_best_match(nq: str, corpus: FuzzyCorpus, score_cutoff: float = 0) -> Tuple[float, int]:
+    # רק השאילתה מנורמלת כאן – הקורפוס כבר מנורמל.
+    # extractOne רץ ב-C ולא מחזיק רשימה של כל המועמדים; מתחת ל-score_cutoff לא חוזר כלום
+    match = process.extractOne(
+        nq, corpus.norm_texts,
+        scorer=fuzz.token_sort_ratio, processor=None, score_cutoff=score_cutoff,
+    )
+    if match is None:
+        return 0.0, -1
+    _, score, pos = match
+    return score, corpus.item_idx[pos]
+
+def fuzzy_best_matches(nqs: List[str], corpus: FuzzyCorpus, score_cutoff: float = 0) -> List[Tuple[float, int]]:
+    # כמו fuzzy_best_match לרשימת שאילתות: מטריצת ציונים אחת (שאילתות × ניסוחים) ב-cdist,
+    # מקבילית על כל הליבות. float64 – אותם ציונים בדיוק כמו extractOne, גם סביב הסף
+    if not nqs or not corpus.norm_texts:
+        return [(0.0, -1)] * len(nqs)
+    scores = process.cdist(
+        nqs, corpus.norm_texts,
+        scorer=fuzz.token_sort_ratio, processor=None, score_cutoff=score_cutoff,
+        dtype=np.float64, workers=-1,
+    )
+    # argmax מחזיר את הניסוח הראשון מבין השווים – כמו extractOne
+    best_pos = scores.argmax(axis=1)
+    results = []
+    for row, pos in enumerate(best_pos):
+        score = float(scores[row, pos])
+        results.append((score, corpus.item_idx[pos]) if score >= score_cutoff else (0.0, -1))
+    return results
+
+
+# ============================================
+#   אינדקס FAISS שמור על הדיסק
+# ============================================
+def faq_content_hash(text: str, model: str = EMBEDDING_MODEL) -> str:
+    # המפתח משתנה כשמשתנה תוכן הקובץ או מודל ה-Embeddings
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+def faq_file_hash(path: str, model: str = EMBEDDING_MODEL, chunk_size: int = 1 << 20) -> str:
+    # אותו ערך כמו faq_content_hash(read_txt_utf8(path), model), בקריאה במנות – בלי הקובץ כולו בזיכרון
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    with open(path, "r", encoding="utf-8") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            h.update(chunk.encode("utf-8"))
+    return h.hexdigest()
+
+def text_content_hash(text: str) -> str:
+    # hash של הטקסט שנשלח ל-Embedding; שינוי בתשובה לא משנה אותו
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def iter_faq_documents(items: Iterable[FAQItem], mode: str = INDEX_MODE) -> Iterator[Document]:
+    # merged – מסמך אחד לכל FAQItem ("שאלה | ניסוח | ...")
+    # multi  – מסמך נפרד לכל שאלה/ניסוח, ממופה חזרה ל-FAQItem דרך idx
+    for i, item in enumerate(items):
+        texts = [item.question] + item.variants
+        if mode == "multi":
+            contents = [t for t in texts if t.strip()]
+        else:
+            contents = [" | ".join(texts)]
+        for content in contents:
+            yield Document(page_content=content, metadata={"idx": i, "embed_hash": text_content_hash(content)})
+
+def build_faq_documents(items: List[FAQItem], mode: str = INDEX_MODE) -> List[Document]:
+    return list(iter_faq_documents(items, mode))
+
+def index_model_name(model: str, mode: str = INDEX_MODE) -> str:
+    # שם המודל שנשמר במפתח האינדקס – אינדקס merged ואינדקס multi לא מתערבבים
+    return model if mode == "merged" else f"{model}/{mode}"
+
+def pool_hits(hits, k: int) -> List[Tuple[int, float]]:
+    # max-pooling לכל FAQItem: המרחק הקטן ביותר מבין הווקטורים שלו (L2 – קטן יותר = קרוב יותר)
+    best = {}
+    for doc, score in hits:
+        idx = doc.metadata["idx"]
+        if idx not in best or score < best[idx]:
+            best[idx] = score
+    return sorted(best.items(), key=lambda x: x[1])[:k]
+
+def embed_queries(embeddings, queries: List[str]) -> List[List[float]]:
+    # וקטורי שאילתות בבקשה אחת לספק. מטמון שאילתות (CachedQueryEmbeddings.embed_queries)
+    # שולח רק את מה שחסר בו; ספק רגיל מקבל את כולן ב-embed_documents
+    embed_many = getattr(embeddings, "embed_queries", None)
+    if embed_many is not None:
+        return embed_many(queries)
+    return embeddings.embed_documents(queries)
+
+def embed_batches(
+    embeddings,
+    docs: Iterable[Document],
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_workers: int = EMBED_MAX_WORKERS,
+    max_retries: int = EMBED_MAX_RETRIES,
+    backoff: float = EMBED_BACKOFF,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    total: Optional[int] = None,
+) -> Iterator[Tuple[List[Document], List[List[float]]]]:
+    # גנרטור: אוסף מסמכים למנות תוך כדי שהם מגיעים (גם מפרסר שעדיין רץ), שולח עד
+    # max_workers מנות במקביל עם ניסיונות חוזרים ו-backoff מעריכי, ומחזיר
+    # (מסמכי המנה, הווקטורים) לפי הסדר. progress(done, total) נקרא אחרי כל מנה
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        for attempt in range(max_retries + 1):
+            try:
+                return embeddings.embed_documents(texts)
+            except Exception as e:
+                # רק שגיאות זמניות; מפתח לא תקין או קלט שגוי נכשלים מיד (והמנוע עובר למצב פאזי)
+                if attempt == max_retries or not is_transient_error(e):
+                    raise
+                time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+    max_workers = max(1, max_workers)
+    pending = deque()
+    done = 0
+
+    def collect():
+        nonlocal done
+        batch, fut = pending.popleft()
+        vectors = fut.result()
+        done += len(batch)
+        if progress is not None:
+            progress(done, total)
+        return batch, vectors
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                pending.append((batch, pool.submit(embed_batch, [d.page_content for d in batch])))
+                batch = []
+                if len(pending) >= max_workers:
+                    yield collect()
+        if batch:
+            pending.append((batch, pool.submit(embed_batch, [d.page_content for d in batch])))
+        while pending:
+            yield collect()
+
+def embed_texts_batched(embeddings, texts: List[str], progress=None, **kwargs) -> List[List[float]]:
+    docs = (Document(page_content=t) for t in texts)
+    return [
+        vec
+        for _, vectors in embed_batches(embeddings, docs, progress=progress, total=len(texts), **kwargs)
+        for vec in vectors
+    ]
+
+def build_faq_store(docs: Iterable[Document], embeddings, progress=None, total: Optional[int] = None) -> FAISS:
+    # האינדקס נבנה מנה אחרי מנה, כך שאפשר להזין אותו ישירות מ-iter_faq_file
+    store = None
+    for batch, vectors in embed_batches(embeddings, docs, progress=progress, total=total):
+        pairs = [(d.page_content, v) for d, v in zip(batch, vectors)]
+        metadatas = [d.metadata for d in batch]
+        if store is None:
+            store = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas)
+        else:
+            store.add_embeddings(pairs, metadatas=metadatas)
+    if store is None:
+        raise ValueError("no FAQ documents to index")
+    return store
+
+def stream_build_faq_store(path: str, embeddings, mode: str = INDEX_MODE, progress=None) -> Tuple[FAISS, List[FAQItem], Dict[str, str]]:
+    # פירסור, Embeddings ובניית אינדקס בצינור אחד: מנות נשלחות ל-Embeddings כבר
+    # בזמן שהקובץ עדיין נקרא. מחזיר גם את הפריטים והקישורים שנאספו בדרך.
+    # שאלה שחוזרת עם אותם ניסוחים – הראשונה נשארת, כמו ב-parse_corpora, כך שה-idx
+    # במסמכים תואם לפריטים של FAQEngine על אותו קובץ
+    links, items, seen = {}, [], set()
+
+    def tee(it: Iterable[FAQItem]) -> Iterator[FAQItem]:
+        for item in it:
+            key = (item.question, tuple(item.variants))
+            if key in seen:
+                continue
+            seen.add(key)
+            items.append(item)
+            yield item
+
+    store = build_faq_store(iter_faq_documents(tee(iter_faq_file(path, links)), mode), embeddings, progress)
+    render_faq_answers(items, links)
+    return store, items, links
+
+def save_faq_index(store: FAISS, key: str, model: str, index_dir: str = INDEX_DIR) -> None:
+    # כתיבה לתיקייה זמנית והחלפה אטומית, כדי שטעינה מקבילה לא תראה אינדקס חצי כתוב
+    tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    faiss.write_index(store.index, os.path.join(tmp_dir, INDEX_FILE))
+
+    docs = []
+    for pos in range(store.index.ntotal):
+        doc_id = store.index_to_docstore_id[pos]
+        doc = store.docstore.search(doc_id)
+        docs.append({"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata})
+
+    meta = {"key": key, "model": model, "docs": docs}
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    if os.path.isdir(index_dir):
+        old_dir = f"{index_dir}.old-{os.getpid()}"
+        os.replace(index_dir, old_dir)
+        os.replace(tmp_dir, index_dir)
+        for name in os.listdir(old_dir):
+            os.remove(os.path.join(old_dir, name))
+        os.rmdir(old_dir)
+    else:
+        os.replace(tmp_dir, index_dir)
+
+def load_faq_index(embeddings, key: Optional[str], index_dir: str = INDEX_DIR,
+                   model: Optional[str] = None, writable: bool = False) -> Optional[FAISS]:
+    # key=None – טוען כל אינדקס קיים של אותו model (בסיס לעדכון אינקרמנטלי)
+    meta_path = os.path.join(index_dir, META_FILE)
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if key is not None and meta.get("key") != key:
+        return None
+    if model is not None and meta.get("model") != model:
+        return None
+
+    # מיפוי לזיכרון (mmap) כשהסוג של האינדקס תומך בכך, אחרת קריאה רגילה.
+    # אינדקס שעומד להשתנות נקרא תמיד לזיכרון
+    index = None
+    if not writable:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = None
+    if index is None:
+        try:
+            index = faiss.read_index(index_path)
+        except RuntimeError:
+            return None
+
+    if index.ntotal != len(meta["docs"]):
+        return None
+
+    docstore = InMemoryDocstore({
+        d["id"]: Document(page_content=d["page_content"], metadata=d["metadata"])
+        for d in meta["docs"]
+    })
+    index_to_docstore_id = {pos: d["id"] for pos, d in enumerate(meta["docs"])}
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def update_faq_index(store: FAISS, docs: List[Document], embeddings, progress=None) -> int:
+    # מעדכן את האינדקס הקיים במקום לבנות מחדש: מסמכים שה-embed_hash שלהם לא השתנה
+    # נשארים (רק ה-idx שלהם מתעדכן), מסמכים שנמחקו יוצאים מהאינדקס לפי ה-id,
+    # ורק מסמכים חדשים/ששונו נשלחים ל-Embeddings. מחזיר את מספר המסמכים שקודדו
+    old_ids_by_hash = {}
+    for pos in range(store.index.ntotal):
+        doc_id = store.index_to_docstore_id[pos]
+        doc = store.docstore.search(doc_id)
+        old_ids_by_hash.setdefault(doc.metadata.get("embed_hash"), []).append(doc_id)
+
+    to_embed = []
+    for doc in docs:
+        ids = old_ids_by_hash.get(doc.metadata["embed_hash"])
+        if ids:
+            kept = store.docstore.search(ids.pop(0))
+            kept.metadata["idx"] = doc.metadata["idx"]
+        else:
+            to_embed.append(doc)
+
+    to_delete = [doc_id for ids in old_ids_by_hash.values() for doc_id in ids]
+    if to_delete:
+        store.delete(to_delete)
+
+    if to_embed:
+        texts = [d.page_content for d in to_embed]
+        vectors = embed_texts_batched(embeddings, texts, progress)
+        store.add_embeddings(list(zip(texts, vectors)), metadatas=[d.metadata for d in to_embed])
+
+    return len(to_embed)
+
+def load_or_build_faq_index(
+    items: List[FAQItem],
+    raw_text: str,
+    embeddings,
+    model: str = EMBEDDING_MODEL,
+    index_dir: str = INDEX_DIR,
+    progress: Optional[Callable[[int, int], None]] = None,
+    mode: str = INDEX_MODE,
+) -> FAISS:
+    model = index_model_name(model, mode)
+    key = faq_content_hash(raw_text, model)
+    store = load_faq_index(embeddings, key, index_dir)
+    if store is not None:
+        return store
+
+    docs = build_faq_documents(items, mode)
+    store = load_faq_index(embeddings, None, index_dir, model=model, writable=True)
+    if store is not None:
+        update_faq_index(store, docs, embeddings, progress)
+    else:
+        store = build_faq_store(docs, embeddings, progress, total=len(docs))
+
+    try:
+        save_faq_index(store, key, model, index_dir)
+    except OSError:
+        # דיסק לקריאה בלבד – ממשיכים עם האינדקס שבזיכרון
+        pass
+    return store
+
+
+# ============================================
+#   Snapshot בינארי לעלייה מהירה: פריטים (לכל קורפוס), קישורים, קורפוס מנורמל ומטריצת Embeddings
+#   מבנה הקובץ:  header (struct) | JSON (utf-8) | float32[nvec * dim]
+# ============================================
+SNAPSHOT_PATH = os.environ.get("FAQ_SNAPSHOT_PATH", ".faq_snapshot.bin")
+SNAPSHOT_MAGIC = b"FAQSNAP1"
+SNAPSHOT_VERSION = 3
+_SNAPSHOT_HEADER = struct.Struct("<8sI64sQII")  # magic, version, key, json_len, nvec, dim
+
+@dataclass
+class FAQSnapshot:
+    answers: List[Dict[str, FAQItem]]
+    links: Dict[str, Dict[str, str]]
+    corpus: FuzzyCorpus
+    docs: List[dict]
+    vectors: Optional["np.ndarray"]
+
+    def make_store(self, embeddings) -> Optional[FAISS]:
+        if self.vectors is None:
+            return None
+        index = faiss.IndexFlatL2(self.vectors.shape[1])
+        index.add(self.vectors)
+        # model_construct מדלג על ולידציית pydantic – המסמכים נכתבו על ידינו ב-save_faq_snapshot
+        docstore = InMemoryDocstore({
+            d["id"]: Document.model_construct(page_content=d["page_content"], metadata=d["metadata"])
+            for d in self.docs
+        })
+        index_to_docstore_id = {pos: d["id"] for pos, d in enumerate(self.docs)}
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def save_faq_snapshot(path: str, key: str, answers: List[Dict[str, FAQItem]], links: Dict[str, Dict[str, str]],
+                      corpus: FuzzyCorpus, store: Optional[FAISS] = None) -> None:
+    # פריט שמשותף לכמה קורפוסים נכתב פעם אחת; answers שומר לכל פריט חיפוש [קורפוס, שורה]
+    rows, row_of = [], {}
+    for per_corpus in answers:
+        for item in per_corpus.values():
+            if id(item) not in row_of:
+                row_of[id(item)] = len(rows)
+                rows.append(item)
+
+    docs, vectors = [], None
+    if store is not None and store.index.ntotal:
+        vectors = store.index.reconstruct_n(0, store.index.ntotal).astype(np.float32, copy=False)
+        for pos in range(store.index.ntotal):
+            doc_id = store.index_to_docstore_id[pos]
+            doc = store.docstore.search(doc_id)
+            docs.append({"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata})
+
+    payload = json.dumps({
+        "items": [[it.question, it.variants, it.answer, it.instruction, it.rendered] for it in rows],
+        "answers": [[[name, row_of[id(it)]] for name, it in per_corpus.items()] for per_corpus in answers],
+        "links": links,
+        "norm_texts": corpus.norm_texts,
+        "item_idx": corpus.item_idx,
+        "norm_questions": corpus.norm_questions,
+        "docs": docs,
+    }, ensure_ascii=False).encode("utf-8")
+
+    nvec, dim = vectors.shape if vectors is not None else (0, 0)
+    header = _SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, key.encode("ascii"), len(payload), nvec, dim)
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+        if vectors is not None:
+            f.write(vectors.tobytes())
+    os.replace(tmp_path, path)
+
+def load_faq_snapshot(path: str, key: str) -> Optional[FAQSnapshot]:
+    # קריאה אחת של כל הקובץ; None אם אין קובץ, גרסה אחרת או hash שלא תואם
+    try:
+        with open(path, "rb") as f:
+            buf = f.read()
+    except OSError:
+        return None
+
+    if len(buf) < _SNAPSHOT_HEADER.size:
+        return None
+    magic, version, snap_key, json_len, nvec, dim = _SNAPSHOT_HEADER.unpack_from(buf, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or snap_key != key.encode("ascii"):
+        return None
+
+    offset = _SNAPSHOT_HEADER.size
+    if len(buf) != offset + json_len + nvec * dim * 4:
+        return None
+    data = json.loads(buf[offset:offset + json_len].decode("utf-8"))
+
+    rows = [FAQItem(q, v, a, i, contact_details={}, rendered=r) for q, v, a, i, r in data["items"]]
+    answers = [{name: rows[row] for name, row in per_corpus} for per_corpus in data["answers"]]
+    items = [next(iter(per_corpus.values())) for per_corpus in answers]
+    corpus = FuzzyCorpus(
+        texts=[t for it in items for t in [it.question] + it.variants],
+        norm_texts=data["norm_texts"],
+        item_idx=data["item_idx"],
+        norm_questions=data["norm_questions"],
+        max_texts_per_item=max((1 + len(it.variants) for it in items), default=0),
+    )
+    vectors = None
+    if nvec:
+        vectors = np.frombuffer(buf, dtype=np.float32, count=nvec * dim, offset=offset + json_len).reshape(nvec, dim)
+    return FAQSnapshot(answers, data["links"], corpus, data["docs"], vectors)
+
+
+# ============================================
+#   מנוע חיפוש משותף – נבנה פעם אחת לכל תהליך ומשרת את כל הסשנים
+# ============================================
+SEMANTIC_UNAVAILABLE = "לא נמצאה תשובה בחיפוש פאזי. החיפוש הסמנטי אינו פעיל עקב שגיאת התחברות ל-OpenAI. נסה לנסח את השאלה מחדש."
+NOT_FOUND = "לא נמצאה תשובה, נסה לנסח את השאלה מחדש."
+
+@dataclass(frozen=True, slots=True)
+class SearchResult:
+    # תוצאת חיפוש מובנית – נשמרת כמו שהיא בהיסטוריית השיחה, בלי פירסור בהצגה.
+    # answer הוא ה-Markdown המשותף של הפריט (לא עותק); item_idx=-1 כשאין התאמה.
+    # stage: fuzzy | semantic | none | unavailable | history (שוחזר מאינדקס פריט בלי שלב ידוע);
+    # similar: אינדקסים של שאלות קשורות. version – גרסת המנוע שהאינדקסים שייכים לה
+    # ("" בתוצאות בלי פריט); אחרי טעינה מחדש של ה-FAQ האינדקסים הישנים לא תקפים.
+    # corpus – הקורפוס שממנו נלקחה התשובה
+    answer: str
+    item_idx: int = -1
+    score: float = 0.0
+    stage: str = "none"
+    similar: Tuple[int, ...] = ()
+    version: str = ""
+    corpus: str = ""
+
+    @property
+    def found(self) -> bool:
+        return self.item_idx >= 0
+
+_NOT_FOUND_RESULT = SearchResult(NOT_FOUND)
+_UNAVAILABLE_RESULT = SearchResult(SEMANTIC_UNAVAILABLE, stage="unavailable")
+
+class FAQEngine:
+    # כל המצב אחרי הבנייה הוא לקריאה בלבד (חוץ מהמטמונים, שהם בטוחים לתהליכונים),
+    # כך שאפשר לקרוא ל-search במקביל מכמה סשנים.
+    # raw_text – טקסט FAQ אחד, או {שם קורפוס: טקסט} לכמה קבצים במנוע ובאינדקס אחד.
+    # items – פריט חיפוש לכל (שאלה, ניסוחים) שונה; answers[idx] – {קורפוס: FAQItem} עם
+    # התשובה של כל קורפוס. search(query, corpus) מחפש רק בפריטים של אותו קורפוס
+
+    def __init__(self, raw_text: Union[str, Dict[str, str]], embeddings=None, model: str = EMBEDDING_MODEL,
+                 index_dir: str = INDEX_DIR, index_mode: str = INDEX_MODE,
+                 snapshot_path: Optional[str] = SNAPSHOT_PATH):
+        texts = {DEFAULT_CORPUS: raw_text} if isinstance(raw_text, str) else dict(raw_text)
+        if not texts:
+            raise ValueError("no FAQ corpora")
+        raw_text = join_corpora(raw_text)
+
+        self.model = model
+        self.index_mode = index_mode
+        self.index_dir = index_dir
+        self.snapshot_path = snapshot_path
+        self.version = faq_content_hash(raw_text, model)
+        self.corpus_names = tuple(texts)
+
+        self.embeddings = embeddings
+        self.store = None
+        self.embeddings_error = None
+        # כשספק ה-Embeddings נכשל שוב ושוב, השלב הסמנטי מדולג לזמן קירור במקום לחכות לו בכל שאילתה
+        self.breaker = CircuitBreaker()
+        self.semantic_error = None
+        self.answer_cache = LRUCache(ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+
+        # עלייה מהירה: snapshot שתואם לתוכן הקובץ, למודל ולמצב האינדקס חוסך פירסור,
+        # נרמול וטעינת אינדקס
+        snapshot_key = faq_content_hash(raw_text, index_model_name(model, index_mode))
+        snapshot = load_faq_snapshot(snapshot_path, snapshot_key) if snapshot_path else None
+        if snapshot is not None and (embeddings is None or snapshot.vectors is not None):
+            self._set_answers(snapshot.answers, snapshot.links, snapshot.corpus)
+            if embeddings is not None:
+                self.store = snapshot.make_store(embeddings)
+            return
+
+        answers, links = parse_corpora(texts)
+        self._set_answers(answers, links)
+
+        if embeddings is not None:
+            try:
+                self.store = load_or_build_faq_index(
+                    self.items, raw_text, embeddings, model, index_dir, mode=index_mode,
+                )
+            except Exception as e:
+                # החיפוש הסמנטי לא זמין – המנוע ממשיך לעבוד במצב פאזי בלבד
+                self.embeddings_error = e
+
+        if snapshot_path and (embeddings is None or self.store is not None):
+            try:
+                save_faq_snapshot(snapshot_path, snapshot_key, self.answers, self.corpus_links, self.corpus, self.store)
+            except OSError:
+                pass
+
+    def _set_answers(self, answers: List[Dict[str, FAQItem]], links: Dict[str, Dict[str, str]],
+                     corpus: Optional[FuzzyCorpus] = None) -> None:
+        self.answers = answers
+        self.items = [next(iter(per_corpus.values())) for per_corpus in answers]
+        self.corpus_links = links
+        self.links = links[self.corpus_names[0]]
+        self.corpus = corpus if corpus is not None else build_fuzzy_corpus(self.items)
+
+        # סינון לפי קורפוס: קורפוס שמכיל את כל הפריטים משתמש בקורפוס הפאזי ובאינדקס כמו שהם;
+        # לאחר – קורפוס פאזי חלקי ורשימת הווקטורים שלו (נבנית בחיפוש הסמנטי הראשון)
+        self._corpus_items = {name: set() for name in self.corpus_names}
+        for idx, per_corpus in enumerate(answers):
+            for name in per_corpus:
+                self._corpus_items[name].add(idx)
+        self._corpus_fuzzy = {
+            name: self.corpus if len(keep) == len(answers) else filter_fuzzy_corpus(self.corpus, keep)
+            for name, keep in self._corpus_items.items()
+        }
+        self._corpus_params = {}
+
+    @classmethod
+    def from_file(cls, path: Union[str, Dict[str, str]] = FAQ_PATH, embeddings=None, **kwargs) -> "FAQEngine":
+        # path – נתיב אחד או {שם קורפוס: נתיב} (ראה faq_sources)
+        return cls(read_corpora(path), embeddings, **kwargs)
+
+    @classmethod
+    def from_backend(cls, backend: str, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                     path: Union[str, Dict[str, str]] = FAQ_PATH, **kwargs) -> "FAQEngine":
+        # המנוע כפי שהאפליקציה וה-API בונים אותו: ספק Embeddings לפי הגדרה, ול-openai מטמון
+        # Embeddings לשאילתות ששורד הרצות חוזרות. כשל ביצירת הספק לא עוצר – המנוע עולה במצב פאזי
+        from faq_embeddings import make_embeddings
+
+        embeddings, model_name, error = None, EMBEDDING_MODEL, None
+        try:
+            embeddings, model_name = make_embeddings(backend, api_key, base_url)
+            if backend == "openai":
+                embeddings = CachedQueryEmbeddings(
+                    embeddings,
+                    model_name,
+                    maxsize=QUERY_CACHE_SIZE,
+                    persist_path=QUERY_CACHE_PATH,
+                    key_fn=normalize_he,
+                )
+        except Exception as e:
+            embeddings, error = None, e
+
+        engine = cls.from_file(path, embeddings, model=model_name, **kwargs)
+        if error is not None:
+            engine.embeddings_error = error
+        return engine
+
+    def rebuild(self, raw_text: Union[str, Dict[str, str]]) -> "FAQEngine":
+        # מנוע חדש לטקסט חדש עם אותן הגדרות ואותו ספק Embeddings (והמטמון שלו). האינדקס
+        # מתעדכן בהדרגה – רק ניסוחים חדשים או ששונו נשלחים ל-Embedding. ה-breaker משותף,
+        # כך שמצב הספק לא מתאפס בטעינה מחדש
+        engine = type(self)(
+            raw_text, self.embeddings, model=self.model, index_dir=self.index_dir,
+            index_mode=self.index_mode, snapshot_path=self.snapshot_path,
+        )
+        engine.breaker = self.breaker
+        return engine
+
+    @property
+    def embeddings_ready(self) -> bool:
+        return self.store is not None
+
+    # --- עיבוד תוכן התשובה ---
+    def process_answer_content(self, item: FAQItem) -> str:
+        # התשובה הוכנה מראש בזמן הטעינה (render_faq_answers)
+        if item.rendered is None:
+            item.rendered = render_answer(item, self.links)
+        return item.rendered
+
+    # --- בחירת קורפוס ---
+    def _check_corpus(self, corpus: Optional[str]) -> None:
+        # corpus=None – חיפוש בכל הקורפוסים (התשובה מהקורפוס הראשון שבו הפריט מופיע)
+        if corpus is not None and corpus not in self._corpus_items:
+            raise ValueError(f"unknown FAQ corpus {corpus!r} (available: {', '.join(self.corpus_names)})")
+
+    def _search_params(self, corpus: Optional[str]):
+        # SearchParameters של FAISS שמגביל את החיפוש לווקטורים של הקורפוס, או None כשאין צורך
+        if corpus is None or self._corpus_fuzzy[corpus] is self.corpus:
+            return None
+        params = self._corpus_params.get(corpus)
+        if params is None:
+            store, keep = self.store, self._corpus_items[corpus]
+            positions = [
+                pos for pos in range(store.index.ntotal)
+                if store.docstore.search(store.index_to_docstore_id[pos]).metadata["idx"] in keep
+            ]
+            selector = faiss.IDSelectorBatch(np.asarray(positions, dtype=np.int64))
+            # הפניה ל-selector נשמרת יחד עם הפרמטרים – SearchParameters לא מחזיק אותו בעצמו
+            params = self._corpus_params[corpus] = (faiss.SearchParameters(sel=selector), selector)
+        return params[0]
+
+    # --- חיפוש FAQ – fuzzy + embeddings ---
+    def search(self, query: str, corpus: Optional[str] = None) -> SearchResult:
+        self._check_corpus(corpus)
+        nq = normalize_he(query)
+
+        # מטמון תשובות: (גרסת FAQ, קורפוס, שאילתה מנורמלת)
+        key = (self.version, corpus, nq)
+        result = self.answer_cache.get(key)
+        if result is not None:
+            return result
+
+        result = self._search_uncached(query, nq, corpus)
+        # תקלה זמנית בחיפוש הסמנטי לא נשמרת במטמון
+        if result.stage != "unavailable":
+            self.answer_cache.put(key, result)
+        return result
+
+    async def asearch(self, query: str, executor=None, speculative: bool = True,
+                      corpus: Optional[str] = None) -> SearchResult:
+        # גרסה אסינכרונית של search עם אותן תוצאות: ה-Embedding של השאילתה מתחיל (aembed_query)
+        # במקביל לשלב הפאזי, שרץ ב-executor, ומבוטל אם הפאזי מצא התאמה. שאילתה שנופלת לשלב
+        # הסמנטי מחכה בערך max(פאזי, Embedding) ולא את הסכום. המחיר: קריאה ל-Embedding גם
+        # לשאילתות שהפאזי פותר (אלא אם היא כבר במטמון או בוטלה לפני שנשלחה); speculative=False מבטל
+        self._check_corpus(corpus)
+        nq = normalize_he(query)
+        key = (self.version, corpus, nq)
+        result = self.answer_cache.get(key)
+        if result is not None:
+            return result
+
+        loop = asyncio.get_running_loop()
+        embed_task = None
+        # הבקשה הספקולטיבית יוצאת רק כשה-breaker סגור – ניסיון ה-half-open שמור לשאילתה שצריכה אותו
+        if speculative and self.store is not None and self.breaker.state == "closed":
+            embed_task = asyncio.ensure_future(self.embeddings.aembed_query(query))
+
+        try:
+            # cdist (דרך fuzzy_best_matches) משחרר את ה-GIL בזמן החישוב, כך שלולאת ה-asyncio
+            # ממשיכה לקדם את בקשת ה-Embedding; extractOne מחזיק את ה-GIL עד הסוף
+            (best_score, best_idx), = await loop.run_in_executor(
+                executor, fuzzy_best_matches, [nq], self._corpus_fuzzy[corpus] if corpus else self.corpus,
+                FUZZY_THRESHOLD,
+            )
+            if best_idx >= 0:
+                result = self._item_result(best_idx, best_score, "fuzzy", corpus=corpus)
+            elif self.store is None or (embed_task is None and not self.breaker.allow()):
+                result = _UNAVAILABLE_RESULT
+            else:
+                # allow() נקרא כאן רק כשאין בקשה ספקולטיבית – ואז ייתכן שהשאילתה הזו היא ניסיון ה-half-open
+                trial = embed_task is None
+                if embed_task is None:
+                    embed_task = asyncio.ensure_future(self.embeddings.aembed_query(query))
+                try:
+                    vector = await embed_task
+                    hits = await loop.run_in_executor(executor, self.semantic_hits_by_vectors, [vector], 5, corpus)
+                except asyncio.CancelledError:
+                    # הקורא ביטל (wait_for, ניתוק לקוח) – הניסיון לא הסתיים; משחררים אותו לשאילתה הבאה
+                    if trial:
+                        self.breaker.release()
+                    raise
+                except Exception as e:
+                    self._semantic_failed(e)
+                    result = _UNAVAILABLE_RESULT
+                else:
+                    self.breaker.record_success()
+                    result = self._semantic_result(nq, hits[0], corpus)
+        finally:
+            if embed_task is not None:
+                if not embed_task.done():
+                    embed_task.cancel()
+                elif not embed_task.cancelled():
+                    embed_task.exception()  # כשלון של בקשה ספקולטיבית שלא נדרשה – לא מדווח כ"לא נקרא"
+
+        if result.stage != "unavailable":
+            self.answer_cache.put(key, result)
+        return result
+
+    def search_many(self, queries: List[str], corpus: Optional[str] = None) -> List[SearchResult]:
+        # כמו search לרשימת שאילתות, עם אותן תוצאות: נרמול פעם אחת לכל שאילתה שונה,
+        # השלב הפאזי כמטריצה אחת, וכל השאילתות שנשארו בלי התאמה נשלחות לספק
+        # ה-Embeddings בבקשה אחת ול-FAISS בחיפוש אחד
+        self._check_corpus(corpus)
+        nqs = [normalize_he(q) for q in queries]
+        results: Dict[str, SearchResult] = {}
+        pending: Dict[str, str] = {}  # שאילתה מנורמלת -> השאילתה המקורית הראשונה
+        for query, nq in zip(queries, nqs):
+            if nq in results or nq in pending:
+                continue
+            cached = self.answer_cache.get((self.version, corpus, nq))
+            if cached is not None:
+                results[nq] = cached
+            else:
+                pending[nq] = query
+
+        if pending:
+            todo = list(pending)
+            fallback = []
+            fuzzy_corpus = self._corpus_fuzzy[corpus] if corpus else self.corpus
+            for nq, (best_score, best_idx) in zip(todo, fuzzy_best_matches(todo, fuzzy_corpus, FUZZY_THRESHOLD)):
+                if best_idx >= 0:
+                    results[nq] = self._item_result(best_idx, best_score, "fuzzy", corpus=corpus)
+                elif self.store is None:
+                    results[nq] = _UNAVAILABLE_RESULT
+                else:
+                    fallback.append(nq)
+
+            if fallback and not self.breaker.allow():
+                for nq in fallback:
+                    results[nq] = _UNAVAILABLE_RESULT
+            elif fallback:
+                try:
+                    vectors = embed_queries(self.embeddings, [pending[nq] for nq in fallback])
+                    all_hits = self.semantic_hits_by_vectors(vectors, k=5, corpus=corpus)
+                except Exception as e:
+                    self._semantic_failed(e)
+                    for nq in fallback:
+                        results[nq] = _UNAVAILABLE_RESULT
+                else:
+                    self.breaker.record_success()
+                    for nq, hits in zip(fallback, all_hits):
+                        results[nq] = self._semantic_result(nq, hits, corpus)
+
+            for nq in todo:
+                if results[nq].stage != "unavailable":
+                    self.answer_cache.put((self.version, corpus, nq), results[nq])
+
+        return [results[nq] for nq in nqs]
+
+    def _search_uncached(self, query: str, nq: str, corpus: Optional[str] = None) -> SearchResult:
+        # --- חיפוש פאזי על שאלות וניסוחים (קורפוס מנורמל מראש) ---
+        fuzzy_corpus = self._corpus_fuzzy[corpus] if corpus else self.corpus
+        best_score, best_idx = fuzzy_best_match(nq, fuzzy_corpus, score_cutoff=FUZZY_THRESHOLD)
+
+        if best_idx >= 0:
+            return self._item_result(best_idx, best_score, "fuzzy", corpus=corpus)
+
+        # --- fallback: embeddings (עם שיפור ניקוד) ---
+        if self.store is None or not self.breaker.allow():
+            return _UNAVAILABLE_RESULT
+
+        try:
+            hits = self.semantic_hits(query, k=5, corpus=corpus)
+        except Exception as e:
+            self._semantic_failed(e)
+            return _UNAVAILABLE_RESULT
+        self.breaker.record_success()
+        return self._semantic_result(nq, hits, corpus)
+
+    def _semantic_failed(self, error: Exception) -> None:
+        # timeout / שגיאת רשת או API אצל ספק ה-Embeddings: השאילתה מקבלת "לא זמין" (לא נשמר
+        # במטמון), והכשלון נספר ב-breaker
+        self.semantic_error = error
+        self.breaker.record_failure()
+
+    def _semantic_result(self, nq: str, hits: List[Tuple[int, float]], corpus: Optional[str] = None) -> SearchResult:
+        items = self.items
+
+        boosted_hits = []
+        for idx, score in hits:
+            fuzzy_score = fuzz.token_sort_ratio(nq, self.corpus.norm_questions[idx])
+            boosted_score = (score * 0.7) + (1.0 - (fuzzy_score / 100)) * 0.3
+            boosted_hits.append((idx, boosted_score))
+
+        boosted_hits.sort(key=lambda x: x[1])
+        if not boosted_hits:
+            return _NOT_FOUND_RESULT
+
+        best_idx, best_score = boosted_hits[0]
+
+        if best_score <= 1.1:
+            result_item = items[best_idx]
+
+            similar = tuple(
+                i
+                for i, s in boosted_hits[1:4]
+                if s <= 1.3 and items[i].question.strip() != result_item.question.strip()
+            )[:3]
+
+            return self._item_result(best_idx, float(best_score), "semantic", similar, corpus)
+
+        return _NOT_FOUND_RESULT
+
+    def format_result(self, result: SearchResult) -> str:
+        # הטקסט המלא להצגה: התשובה + מקור ושאלה מזוהה (בלי השאלות הקשורות)
+        if not result.found:
+            return result.answer
+        question = self.items[result.item_idx].question
+        label = "שאלה מזוהה (סמנטי)" if result.stage == "semantic" else "שאלה מזוהה"
+        return f"{result.answer}\n\nמקור: {result.corpus}\n\n{label}: {question}"
+
+    def similar_questions(self, result: SearchResult) -> List[str]:
+        return [self.items[i].question for i in result.similar]
+
+    def result_for_item(self, idx: int, corpus: Optional[str] = None, stage: str = "history") -> SearchResult:
+        # שחזור תוצאה מאינדקס פריט ושלב (תור דחוס בהיסטוריה) – בלי ניקוד ובלי שאלות קשורות.
+        # בלי פריט: "לא זמין" נשאר "לא זמין", כל השאר – "לא נמצא"
+        if not 0 <= idx < len(self.items) or (corpus and corpus not in self.answers[idx]):
+            return _UNAVAILABLE_RESULT if stage == "unavailable" else _NOT_FOUND_RESULT
+        return self._item_result(idx, 0.0, stage, corpus=corpus)
+
+    def _item_result(self, idx: int, score: float, stage: str, similar: Tuple[int, ...] = (),
+                     corpus: Optional[str] = None) -> SearchResult:
+        per_corpus = self.answers[idx]
+        if not corpus:
+            corpus = next(iter(per_corpus))
+        answer = self.process_answer_content(per_corpus[corpus])
+        return SearchResult(answer, idx, score, stage, similar, self.version, corpus)
+
+    def semantic_hits(self, query: str, k: int = 5, corpus: Optional[str] = None) -> List[Tuple[int, float]]:
+        # k הפריטים הקרובים ביותר: (אינדקס FAQItem, מרחק). במצב multi מביאים מספיק
+        # וקטורים כדי שיהיו לפחות k פריטים שונים, ומאחדים לפי הפריט
+        if self._search_params(corpus) is not None:
+            return self.semantic_hits_by_vectors([self.embeddings.embed_query(query)], k, corpus)[0]
+        fetch_k = k
+        if self.index_mode == "multi":
+            fetch_k = k * max(self.corpus.max_texts_per_item, 1)
+        return pool_hits(self.store.similarity_search_with_score(query, k=fetch_k), k)
+
+    def semantic_hits_by_vectors(self, vectors: List[List[float]], k: int = 5,
+                                 corpus: Optional[str] = None) -> List[List[Tuple[int, float]]]:
+        # כמו semantic_hits לכמה וקטורי שאילתה כבר מחושבים – קריאה אחת ל-index.search
+        fetch_k = k
+        if self.index_mode == "multi":
+            fetch_k = k * max(self.corpus.max_texts_per_item, 1)
+        store = self.store
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if store._normalize_L2:
+            faiss.normalize_L2(matrix)
+        scores, indices = store.index.search(matrix, fetch_k, params=self._search_params(corpus))
+
+        all_hits = []
+        for row_scores, row_indices in zip(scores, indices):
+            hits = [
+                (store.docstore.search(store.index_to_docstore_id[i]), score)
+                for i, score in zip(row_indices, row_scores)
+                if i != -1
+            ]
+            all_hits.append(pool_hits(hits, k))
+        return all_hits
+
+    def corpora_stats(self) -> dict:
+        # כמה פריטים בכל קורפוס, מול מה שהמנוע מחזיק בפועל אחרי איחוד הכפילויות
+        return {
+            "corpora": {name: len(keep) for name, keep in self._corpus_items.items()},
+            "items_total": sum(len(per_corpus) for per_corpus in self.answers),
+            "unique_questions": len(self.items),
+            "unique_answers": len({id(item) for per_corpus in self.answers for item in per_corpus.values()}),
+            "vectors": self.store.index.ntotal if self.store is not None else 0,
+        }
+
+    def stats(self) -> dict:
+        stats = {"version": self.version[:12], "items": len(self.items), "answers": self.answer_cache.stats()}
+        if len(self.corpus_names) > 1:
+            stats["corpora"] = self.corpora_stats()
+        stats["semantic_breaker"] = self.breaker.stats()
+        if self.semantic_error is not None:
+            stats["semantic_breaker"]["last_error"] = repr(self.semantic_error)
+        if hasattr(self.embeddings, "stats"):
+            stats["query_embeddings"] = self.embeddings.stats()
+        return stats
+
+
+# ============================================
+#   בנייה מראש (offline):  python faq_engine.py [faq.txt | faq.txt,faq1.txt,...]
+# ============================================
+if __name__ == "__main__":
+    import argparse
+    from faq_embeddings import EMBEDDING_BACKEND, EMBEDDING_BACKENDS, make_embeddings
+
+    parser = argparse.ArgumentParser(description="בניית אינדקס FAISS שמור עבור קובץ FAQ")
+    parser.add_argument("faq_path", nargs="?", default=FAQ_CORPORA or FAQ_PATH, help="קובץ אחד או כמה, מופרדים בפסיק")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--mode", default=INDEX_MODE, choices=INDEX_MODES)
+    parser.add_argument("--base-url", default=None, help="שרת Embeddings תואם OpenAI (למשל שרת מקומי לבדיקות)")
+    args = parser.parse_args()
+
+    def print_progress(done: int, total: Optional[int]) -> None:
+        print(f"\rembedding {done}/{total or '?'}", end="", flush=True)
+
+    # אותם פריטי חיפוש ואותו מפתח כמו ב-FAQEngine, כך שהמנוע טוען את האינדקס כמו שהוא
+    sources = faq_sources(args.faq_path)
+    emb, model_name = make_embeddings(args.backend, base_url=args.base_url)
+    index_model = index_model_name(model_name, args.mode)
+    if isinstance(sources, str) and load_faq_index(emb, None, args.index_dir, model=index_model) is None:
+        # בנייה קרה של קובץ אחד: פירסור, Embeddings ו-FAISS בצינור אחד – מנות יוצאות ל-Embeddings
+        # כבר בזמן הקריאה, והקובץ עצמו לא נטען לזיכרון בשלמותו
+        store, _, _ = stream_build_faq_store(sources, emb, args.mode, print_progress)
+        save_faq_index(store, faq_file_hash(sources, index_model), index_model, args.index_dir)
+    else:
+        # יש אינדקס קודם (עדכון אינקרמנטלי) או כמה קבצים
+        raw = read_corpora(sources)
+        faq_answers, _ = parse_corpora({DEFAULT_CORPUS: raw} if isinstance(raw, str) else raw)
+        faq_items = [next(iter(per_corpus.values())) for per_corpus in faq_answers]
+        store = load_or_build_faq_index(
+            faq_items, join_corpora(raw), emb, model_name, args.index_dir, print_progress, mode=args.mode,
+        )
+    print()
+    print(f"index ready: {store.index.ntotal} vectors -> {args.index_dir}")
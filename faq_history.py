@@ -0,0 +1,101 @@
+# ============================================
+#   היסטוריית שיחה לכל סשן – חסומה בגודל, עם דחיסה של תורות ישנים
+#   תורות חדשים נשמרים עם ה-SearchResult המלא; ישנים יותר נדחסים ל-(שאלה, אינדקס פריט, שלב)
+#   והתשובה משוחזרת מהמנוע המשותף רק כשמציגים אותם; מעבר לתקרה – נמחקים.
+#   אחרי טעינה מחדש של ה-FAQ (גרסת מנוע אחרת) תור מוצג מחושב מחדש מהשאלה.
+#   כל תור זוכר את הקורפוס שהמשתמש בחר (None – כל הקבצים), שלפיו מחפשים שוב, ואת הקורפוס
+#   שממנו הגיעה התשובה, כך ששחזור תור דחוס מחזיר את התשובה מאותו קובץ
+# ============================================
+
+import os
+import sys
+from typing import Iterator, List, Optional, Tuple, Union
+
+from faq_engine import FAQEngine, SearchResult
+
+# כמה תורות אחרונים נשמרים במלואם, וכמה תורות בסך הכול (כולל דחוסים) נשמרים לכל סשן
+HISTORY_FULL_TURNS = int(os.environ.get("FAQ_HISTORY_FULL_TURNS", "20"))
+HISTORY_MAX_TURNS = int(os.environ.get("FAQ_HISTORY_MAX_TURNS", "200"))
+
+# תור מלא: (מזהה, שאלה, SearchResult, גרסה, קורפוס התשובה, קורפוס שנבחר);
+# תור דחוס: אותו דבר עם (אינדקס פריט או -1, שלב) במקום ה-SearchResult – השלב שומר את ההבדל
+# בין "לא נמצא" ל"חיפוש סמנטי לא זמין", ואת התווית "(סמנטי)" בהצגה.
+# הגרסה היא של המנוע שהאינדקסים שייכים לו ("" – תוצאה בלי פריט, תקפה בכל גרסה)
+Turn = Tuple[int, str, Union[SearchResult, Tuple[int, str]], str, str, Optional[str]]
+
+
+class ChatHistory:
+    # מזהה התור עולה ברציפות ולא משתנה כשתורות נדחסים או נמחקים,
+    # כך שאפשר להשתמש בו כמפתח יציב לווידג'טים
+
+    def __init__(self, full_turns: int = HISTORY_FULL_TURNS, max_turns: int = HISTORY_MAX_TURNS):
+        self.full_turns = full_turns
+        self.max_turns = max(max_turns, full_turns)
+        self.turns: List[Turn] = []
+        self.next_id = 0
+        self.compacted = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def append(self, query: str, result: SearchResult, corpus: Optional[str] = None) -> None:
+        # corpus – הקורפוס שהחיפוש הוגבל אליו (None – כל הקבצים)
+        self.turns.append((self.next_id, query, result, result.version, result.corpus, corpus))
+        self.next_id += 1
+
+        # התור המלא הוותיק ביותר שיצא מהחלון נדחס (בכל הוספה יוצא לכל היותר אחד)
+        pos = len(self.turns) - self.full_turns - 1
+        if pos >= 0:
+            turn_id, q, r, version, answer_corpus, corpus = self.turns[pos]
+            if isinstance(r, SearchResult):
+                self.turns[pos] = (turn_id, q, (r.item_idx, r.stage), version, answer_corpus, corpus)
+                self.compacted += 1
+
+        overflow = len(self.turns) - self.max_turns
+        if overflow > 0:
+            del self.turns[:overflow]
+            self.dropped += overflow
+
+    def recent(self, engine: FAQEngine, n: int) -> Iterator[Tuple[int, str, SearchResult]]:
+        # n התורות האחרונים, מהחדש לישן; תורות דחוסים משוחזרים מהמנוע
+        start = max(len(self.turns) - n, 0)
+        for pos in range(len(self.turns) - 1, start - 1, -1):
+            turn_id, query, result, version, answer_corpus, corpus = self.turns[pos]
+            if version and version != engine.version:
+                # ה-FAQ נטען מחדש – האינדקס הישן לא תקף; מחפשים שוב עם אותה בחירת קורפוס
+                # ושומרים את התוצאה העדכנית – מלאה רק בתוך חלון full_turns, מחוצה לו דחוסה,
+                # כדי שהתקרה על תורות מלאים תישמר גם אחרי טעינה מחדש.
+                # קורפוס שכבר לא נטען – חיפוש בכל הקבצים
+                if corpus not in engine.corpus_names:
+                    corpus = None
+                result = engine.search(query, corpus)
+                stored = result
+                if pos < len(self.turns) - self.full_turns:
+                    stored = (result.item_idx, result.stage)
+                self.turns[pos] = (turn_id, query, stored, result.version, result.corpus, corpus)
+            elif not isinstance(result, SearchResult):
+                item_idx, stage = result
+                result = engine.result_for_item(item_idx, answer_corpus or None, stage)
+            yield turn_id, query, result
+
+    def memory_report(self) -> dict:
+        # הערכת הזיכרון שהסשן מחזיק בעצמו. טקסט התשובות שייך למנוע המשותף ולא נספר
+        own = sys.getsizeof(self.turns)
+        full = 0
+        for turn in self.turns:
+            own += sys.getsizeof(turn) + sys.getsizeof(turn[1])
+            result = turn[2]
+            if isinstance(result, SearchResult):
+                full += 1
+                own += sys.getsizeof(result) + sys.getsizeof(result.similar)
+            else:
+                own += sys.getsizeof(result)
+        return {
+            "turns": len(self.turns),
+            "full": full,
+            "compacted": len(self.turns) - full,
+            "compacted_total": self.compacted,
+            "dropped_total": self.dropped,
+            "bytes": own,
+        }
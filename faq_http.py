@@ -0,0 +1,287 @@
+# ============================================
+#   שכבת HTTP משותפת
+#   Session אחד עם חיבורי keep-alive ממוחזרים, timeout לכל קריאה,
+#   ו-circuit breaker שמדלג על שירות שנכשל שוב ושוב במקום לחכות לו בכל שאילתה
+#   + RemoteFAQ: קובץ FAQ מרוחק עם עותק מקומי ובדיקה מחדש ברקע בבקשות מותנות (ETag / Last-Modified)
+# ============================================
+
+import os
+import json
+import hashlib
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (התחברות, קריאה) בשניות – בלי timeout שרת איטי תוקע את התהליכון של Streamlit
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("FAQ_HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.environ.get("FAQ_HTTP_READ_TIMEOUT", "10"))
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+HTTP_POOL_SIZE = int(os.environ.get("FAQ_HTTP_POOL_SIZE", "16"))
+HTTP_RETRIES = int(os.environ.get("FAQ_HTTP_RETRIES", "2"))
+
+# ספק ה-Embeddings: זמן מקסימלי לבקשה וניסיונות חוזרים של לקוח OpenAI (ברירת המחדל שלו: 600 שניות)
+EMBED_REQUEST_TIMEOUT = float(os.environ.get("FAQ_EMBED_TIMEOUT", "10"))
+EMBED_CLIENT_RETRIES = int(os.environ.get("FAQ_EMBED_CLIENT_RETRIES", "1"))
+
+# FAQ מרוחק: תיקיית העותק המקומי, וכל כמה שניות בודקים מול השרת אם הקובץ השתנה
+REMOTE_CACHE_DIR = os.environ.get("FAQ_REMOTE_CACHE_DIR", ".faq_remote")
+REMOTE_REFRESH = float(os.environ.get("FAQ_REMOTE_REFRESH", "300"))
+
+# circuit breaker: אחרי כמה כשלונות רצופים נפתח, ולכמה שניות
+BREAKER_FAILURES = int(os.environ.get("FAQ_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.environ.get("FAQ_BREAKER_COOLDOWN", "30"))
+
+_session = None
+_httpx_client = None
+_lock = threading.Lock()
+
+
+# ============================================
+#   requests: Session משותף
+# ============================================
+def get_session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_RETRIES, backoff_factor=0.5,
+                status_forcelist=(502, 503, 504), allowed_methods=("GET", "HEAD"),
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def http_get(url: str, timeout=HTTP_TIMEOUT, **kwargs) -> requests.Response:
+    return get_session().get(url, timeout=timeout, **kwargs)
+
+def fetch_text(url: str, timeout=HTTP_TIMEOUT) -> str:
+    resp = http_get(url, timeout=timeout)
+    resp.raise_for_status()
+    resp.encoding = "utf-8"
+    return resp.text
+
+
+# ============================================
+#   FAQ מרוחק עם בקשות מותנות
+# ============================================
+class RemoteFAQ:
+    # הגוף נשמר על הדיסק יחד עם ה-ETag וה-Last-Modified שלו, כך שעלייה קרה קוראת מהדיסק
+    # ולא מורידה שוב. refresh() שולח If-None-Match / If-Modified-Since: 304 לא מוריד כלום,
+    # ו-text מתחלף רק כשהשרת מחזיר תוכן שונה באמת – רק אז צריך לפרסר ולבנות אינדקס מחדש.
+    # text מוחלף בהשמה אחת; start() בודק מחדש ברקע כל interval שניות
+
+    def __init__(self, url: str, cache_dir: str = REMOTE_CACHE_DIR, interval: float = REMOTE_REFRESH,
+                 timeout=HTTP_TIMEOUT):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, f"{key}.txt")
+        self.meta_path = os.path.join(cache_dir, f"{key}.json")
+
+        self.text: Optional[str] = None
+        self.etag = None
+        self.last_modified = None
+        self.fetched = 0
+        self.not_modified = 0
+        self.updates = 0
+        self.last_error = None
+        self._thread = None
+        self._stop = threading.Event()
+
+        self._load_cached()
+        if self.text is None:
+            # אין עותק מקומי – ההורדה הראשונה חוסמת (ושגיאה בה עולה לקורא)
+            self.refresh()
+
+    def _load_cached(self) -> None:
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self.path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, ValueError):
+            return
+        if meta.get("url") == self.url:
+            self.text, self.etag, self.last_modified = text, meta.get("etag"), meta.get("last_modified")
+
+    def _save(self, text: str) -> None:
+        # קודם הגוף ואז המטא-דאטה, כל אחד בכתיבה לקובץ זמני + os.replace – אף פעם לא ETag חדש עם גוף ישן
+        tmp = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+        tmp = f"{self.meta_path}.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"url": self.url, "etag": self.etag, "last_modified": self.last_modified}, f)
+        os.replace(tmp, self.meta_path)
+
+    def refresh(self) -> bool:
+        # True אם התוכן השתנה
+        headers = {}
+        if self.text is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+
+        resp = http_get(self.url, timeout=self.timeout, headers=headers)
+        if resp.status_code == 304:
+            self.not_modified += 1
+            return False
+        resp.raise_for_status()
+        resp.encoding = "utf-8"
+        self.fetched += 1
+
+        text = resp.text
+        self.etag = resp.headers.get("ETag")
+        self.last_modified = resp.headers.get("Last-Modified")
+        changed = text != self.text
+        self._save(text)
+        if changed:
+            self.text = text
+            self.updates += 1
+        return changed
+
+    def start(self) -> "RemoteFAQ":
+        # בדיקה ראשונה מיד (העותק מהדיסק אולי ישן), ואחר כך כל interval שניות
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="faq-remote", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+                self.last_error = None
+            except requests.RequestException as e:
+                # השרת לא זמין – ממשיכים עם העותק האחרון
+                self.last_error = e
+            if self._stop.wait(self.interval):
+                return
+
+    def stats(self) -> dict:
+        return {
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "fetched": self.fetched,
+            "not_modified": self.not_modified,
+            "updates": self.updates,
+            "last_error": repr(self.last_error) if self.last_error is not None else None,
+        }
+
+
+# ============================================
+#   שגיאות זמניות: שווה לנסות שוב
+# ============================================
+def is_transient_error(error: BaseException) -> bool:
+    # timeout, שגיאת חיבור, 429 או 5xx. 400/401/403/404 (קלט שגוי, מפתח לא תקין) לא ישתנו
+    # בניסיון חוזר. מזהה את השגיאות של requests, httpx ו-openai בלי לייבא את openai
+    if isinstance(error, (TimeoutError, ConnectionError, requests.Timeout, requests.ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # httpx.TransportError (timeout/חיבור), ו-openai.APIConnectionError / APITimeoutError שעוטפים אותה
+    return any(cls.__name__ in ("TransportError", "APIConnectionError") for cls in type(error).__mro__)
+
+
+# ============================================
+#   httpx: לקוח משותף לספק ה-Embeddings (OpenAI)
+# ============================================
+def get_httpx_client():
+    # לקוח סינכרוני אחד לכל התהליך. הלקוח האסינכרוני לא משותף – המאגר שלו קשור ללולאת asyncio
+    global _httpx_client
+    import httpx
+
+    with _lock:
+        if _httpx_client is None:
+            _httpx_client = httpx.Client(
+                timeout=httpx.Timeout(EMBED_REQUEST_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            )
+        return _httpx_client
+
+
+# ============================================
+#   Circuit breaker
+# ============================================
+class CircuitBreaker:
+    # closed – הכול עובר; אחרי failures כשלונות רצופים עובר ל-open ולמשך cooldown שניות
+    # allow() מחזיר False. אחר כך half-open: קריאת ניסיון אחת עוברת – הצלחה סוגרת,
+    # כשלון פותח מחדש לעוד cooldown. ניסיון שבוטל משוחרר ב-release(); ניסיון שלא דיווח
+    # בכלל פג אחרי cooldown שניות, וקריאה אחרת מקבלת את הניסיון
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = False
+        self.trial_at = None
+        self.skipped = 0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            now = time.monotonic()
+            if state == "half-open" and (not self.trial or now - self.trial_at >= self.cooldown):
+                self.trial = True
+                self.trial_at = now
+                return True
+            self.skipped += 1
+            return False
+
+    def release(self) -> None:
+        # ניסיון ה-half-open לא הסתיים (בוטל) – לא הצלחה ולא כשלון
+        with self._lock:
+            self.trial = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive += 1
+            if self.trial or self.consecutive >= self.failures:
+                if self.opened_at is None:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive,
+            "trips": self.trips,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,97 @@
+# ============================================
+#   טעינה מחדש של faq.txt (או של כל קבצי הקורפוסים) בלי הפסקת שירות
+#   תהליכון רקע בודק את הקבצים כל כמה שניות (os.stat – בלי תלות ב-inotify), וכשהתוכן משתנה
+#   בונה מנוע חדש (פירסור + עדכון אינדקס) ורק כשהוא מוכן מחליף אותו בהשמה אחת.
+#   שאילתות שכבר רצות ממשיכות עם המנוע הישן שבידן – אף אחת לא רואה אינדקס חצי בנוי
+# ============================================
+
+import os
+import threading
+import time
+from typing import Dict, Union
+
+from faq_engine import FAQEngine, faq_content_hash, join_corpora, read_corpora
+
+# כל כמה שניות בודקים את הקובץ (0 – בלי טעינה מחדש), וכמה מחכים לפני ניסיון חוזר אחרי כשלון
+RELOAD_INTERVAL = float(os.environ.get("FAQ_RELOAD_INTERVAL", "2"))
+RELOAD_RETRY = float(os.environ.get("FAQ_RELOAD_RETRY", "30"))
+
+
+class FAQReloader:
+    # engine – תמיד מנוע שלם ומוכן. קוראים אותו פעם אחת לכל בקשה/הרצה ועובדים עם ההפניה הזו.
+    # path – נתיב אחד או {שם קורפוס: נתיב}, כמו שהמנוע נבנה (faq_sources); שינוי בכל אחד
+    # מהקבצים בונה מנוע חדש לכולם
+
+    def __init__(self, path: Union[str, Dict[str, str]], engine: FAQEngine, interval: float = RELOAD_INTERVAL,
+                 retry: float = RELOAD_RETRY):
+        self.path = path
+        self.engine = engine
+        self.interval = interval
+        self.retry = retry
+        self.reloads = 0
+        self.last_reload = None
+        self.last_error = None
+        self._stat = self._file_stat()
+        self._retry_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _file_stat(self):
+        paths = [self.path] if isinstance(self.path, str) else list(self.path.values())
+        try:
+            stats = [os.stat(p) for p in paths]
+        except OSError:
+            return None
+        return tuple((st.st_mtime_ns, st.st_size) for st in stats)
+
+    def start(self) -> "FAQReloader":
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="faq-reload", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            stat = self._file_stat()
+            due = self._retry_at is not None and time.monotonic() >= self._retry_at
+            if stat is not None and (stat != self._stat or due):
+                self._stat = stat
+                self.reload_now()
+
+    def reload_now(self) -> bool:
+        # מחזיר True אם הוחלף מנוע. קובץ בלי שינוי בתוכן (למשל רק touch) לא בונה כלום
+        self._retry_at = None
+        current = self.engine
+        try:
+            raw_text = read_corpora(self.path)
+            if faq_content_hash(join_corpora(raw_text), current.model) == current.version:
+                return False
+            engine = current.rebuild(raw_text)
+        except Exception as e:
+            self.last_error = e
+            self._retry_at = time.monotonic() + self.retry
+            return False
+
+        # הספק נפל באמצע בניית האינדקס – לא מחליפים מנוע סמנטי במנוע פאזי בלבד; ננסה שוב
+        if current.store is not None and engine.store is None:
+            self.last_error = engine.embeddings_error
+            self._retry_at = time.monotonic() + self.retry
+            return False
+
+        self.engine = engine
+        self.reloads += 1
+        self.last_reload = time.time()
+        self.last_error = None
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "version": self.engine.version[:12],
+            "reloads": self.reloads,
+            "last_reload": self.last_reload,
+            "last_error": repr(self.last_error) if self.last_error is not None else None,
+            "watching": self._thread is not None and self._thread.is_alive(),
+        }